@@ -0,0 +1,139 @@
+"""Compare the persona inference backends on this machine.
+
+Every backend is loaded in its own subprocess so load time and peak RSS are
+not skewed by a previously loaded model. Use a small local model, e.g.
+
+    python benchmarks/bench_backends.py --model-id path/to/small-model --threads 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import psutil
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+SAMPLE_WALLET = {
+    "address": "0x1234567890abcdef1234567890abcdef12345678",
+    "total_networth": 125000.5,
+    "native_balance": 12.5,
+    "token_balance_usd": 80000.0,
+    "chain": "eth",
+    "wallet_health_score": 72,
+    "risk_score": 35,
+    "activity_score": 540,
+    "token_count": 14,
+    "top_tokens": ["USDC", "WETH", "LINK"],
+    "defi_protocols": 3,
+    "total_defi_usd": 20000.0,
+    "unique_nft_collections": 4,
+    "classifications": ["Whale", "DeFi User"],
+}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    try:
+        import resource
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+
+
+def run_backend(args):
+    """Load one backend, time greedy generation and return the measurements."""
+    from test import WalletPersonaGenerator
+
+    started = time.perf_counter()
+    generator = WalletPersonaGenerator(
+        model_id=args.model_id,
+        backend=args.backend,
+        num_threads=args.threads,
+        max_batch_size=1,
+        cache_size=0
+    )
+    load_seconds = time.perf_counter() - started
+
+    content = generator.build_prompt(SAMPLE_WALLET, detailed=True)
+    inputs = generator._tokenize([content])
+    generate_kwargs = dict(
+        max_new_tokens=args.new_tokens,
+        min_new_tokens=args.new_tokens,
+        do_sample=False,
+        pad_token_id=generator.tokenizer.pad_token_id
+    )
+
+    # One warm-up run so one-time kernel setup is not counted
+    generator.model.generate(**inputs, max_new_tokens=4, do_sample=False,
+                             pad_token_id=generator.tokenizer.pad_token_id)
+
+    timings = []
+    for _ in range(args.repeats):
+        started = time.perf_counter()
+        output = generator.model.generate(**inputs, **generate_kwargs)
+        timings.append(time.perf_counter() - started)
+    new_tokens = output.shape[1] - inputs["input_ids"].shape[1]
+    best = min(timings)
+
+    return {
+        "backend": args.backend,
+        "threads": args.threads,
+        "load_seconds": round(load_seconds, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "prompt_tokens": int(inputs["input_ids"].shape[1]),
+        "new_tokens": int(new_tokens),
+        "generate_seconds": round(best, 3),
+        "tokens_per_second": round(new_tokens / best, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark persona inference backends")
+    parser.add_argument("--model-id", type=str, required=True, help="Small local model to benchmark")
+    parser.add_argument("--backends", nargs="+", default=["cpu", "cpu-bf16", "cpu-int8"],
+                        help="Backends to compare")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="CPU threads for inference")
+    parser.add_argument("--new-tokens", type=int, default=64, help="Tokens generated per run")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per backend (best is reported)")
+    parser.add_argument("--output", type=str, help="Also write the results to this JSON file")
+    parser.add_argument("--backend", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        # Child process: benchmark a single backend and print its result
+        print(json.dumps(run_backend(args)))
+        return
+
+    results = []
+    for backend in args.backends:
+        print(f"Benchmarking {backend}...", file=sys.stderr)
+        cmd = [
+            sys.executable, __file__,
+            "--model-id", args.model_id,
+            "--backend", backend,
+            "--threads", str(args.threads),
+            "--new-tokens", str(args.new_tokens),
+            "--repeats", str(args.repeats),
+        ]
+        proc = subprocess.run(cmd, capture_output=True, text=True, cwd=REPO_ROOT)
+        if proc.returncode != 0:
+            error = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+            results.append({"backend": backend, "error": error})
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        Path(args.output).write_text(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""Benchmark the wallet pipeline on synthetic datasets.
+
+Times loading, single-wallet and bulk feature extraction, classification
+and report rendering on datasets written by synthetic_data.py, and
+optionally WalletPersonaGenerator with a tiny stub model:
+
+    python benchmarks/bench_pipeline.py --wallets 1000 100000 --generator --output results.json
+    python benchmarks/bench_pipeline.py --wallets 1000 --baseline results.json
+
+Each dataset size runs in its own subprocess so peak RSS is not carried
+over between sizes. Every stage reports the best of --repeats runs and the
+peak Python allocation of one extra run under tracemalloc. Datasets are
+cached under benchmarks/.data/ and reused by later runs with the same seed.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_backends import peak_rss_mb
+
+DATA_ROOT = Path(__file__).resolve().parent / ".data"
+
+SAMPLE_PERSONA = (
+    "## Crypto Identity\nA long-term holder who keeps most of their worth in the native token.\n\n"
+    "## Trading Style\nInfrequent, large transfers.\n\n"
+    "## Risk Profile\nConservative.\n\n"
+    "## Recommendations\n- Stake idle ETH\n- Diversify into stablecoins\n"
+)
+
+
+def dataset_dir(wallets, seed):
+    """Return the directory of a synthetic dataset, generating it on first use."""
+    from synthetic_data import generate_dataset
+
+    path = DATA_ROOT / f"{wallets}-seed{seed}"
+    marker = path / ".complete"
+    if not marker.exists():
+        print(f"Generating {wallets} synthetic wallets in {path}...", file=sys.stderr)
+        generate_dataset(path, wallets, seed)
+        marker.touch()
+    return path
+
+
+def measure(fn, repeats, items=1, memory=True):
+    """Time fn (best of repeats) and record the peak allocation of one more run.
+
+    Args:
+        fn: Callable running the stage once
+        repeats: Timed runs
+        items: Units of work per run (wallets, reports), for the per-item time
+        memory: Also run once under tracemalloc for the peak allocation
+
+    Returns:
+        Dict of best and median seconds, per-item milliseconds and peak MB
+    """
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeats):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        peak = None
+        if memory:
+            tracemalloc.start()
+            fn()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    best = min(timings)
+    return {
+        "seconds": round(best, 6),
+        "median_seconds": round(float(np.median(timings)), 6),
+        "items": items,
+        "per_item_ms": round(best / items * 1000, 4),
+        "peak_alloc_mb": round(peak / (1024 * 1024), 2) if peak is not None else None,
+    }
+
+
+def sample_wallets(data_dir, count, seed):
+    """A reproducible random sample of the dataset's wallets."""
+    wallets = pd.read_csv(data_dir / "wallets.csv")["wallet_ID"].to_numpy(dtype=object)
+    rng = np.random.default_rng(seed)
+    return list(rng.choice(wallets, size=min(count, len(wallets)), replace=False))
+
+
+def run_size(args):
+    """Benchmark the data stages on one dataset size and return the measurements."""
+    from dataLoading import (
+        build_segment_index, classify_many, classify_wallet, extract_features_bulk, extract_wallet_features,
+        load_wallet_data, query_cohort
+    )
+    from visualization import generate_html_report
+
+    data_dir = dataset_dir(args.size, args.seed)
+    stages = {}
+    stages["load"] = measure(lambda: load_wallet_data(data_dir), args.repeats)
+    stages["load_without_features"] = measure(
+        lambda: load_wallet_data(data_dir, precompute_features=False), args.repeats
+    )
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = load_wallet_data(data_dir)
+    sample = sample_wallets(data_dir, args.sample, args.seed)
+
+    stages["single_wallet_features"] = measure(
+        lambda: [extract_wallet_features(wallet, data) for wallet in sample], args.repeats, len(sample)
+    )
+    # The per-wallet reference path, used for dicts without a precomputed feature table
+    without_table = {key: value for key, value in data.items() if key != "features"}
+    stages["single_wallet_features_uncached"] = measure(
+        lambda: [extract_wallet_features(wallet, without_table) for wallet in sample], args.repeats, len(sample)
+    )
+    stages["bulk_features"] = measure(lambda: extract_features_bulk(data), args.repeats, args.size)
+
+    features = [extract_wallet_features(wallet, data) for wallet in sample]
+    stages["classify"] = measure(
+        lambda: [classify_wallet(entry) for entry in features], args.repeats, len(features)
+    )
+    stages["classify_bulk"] = measure(lambda: classify_many(data["features"]), args.repeats, args.size)
+    stages["segment_index"] = measure(
+        lambda: build_segment_index(data["features"], data["networth"]), args.repeats, args.size
+    )
+    stages["cohort_query"] = measure(
+        lambda: query_cohort(data["segments"], ["nft_collector"], "eth", {"total_networth": (10_000, 100_000)}),
+        args.repeats
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        stages["render_report"] = measure(
+            lambda: [generate_html_report(entry, SAMPLE_PERSONA, os.path.join(tmp, f"{i}.html"))
+                     for i, entry in enumerate(features)],
+            args.repeats,
+            len(features)
+        )
+
+    return {
+        "wallets": args.size,
+        "rows": {name: int(len(data[name])) for name in ("networth", "tokens", "defi", "nfts", "stats")},
+        "stages": stages,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def run_generator(args):
+    """Benchmark WalletPersonaGenerator with a stub model on synthetic wallets."""
+    import torch
+    from concurrent.futures import ThreadPoolExecutor
+    from dataLoading import extract_features_many, load_wallet_data
+    from stub_model import build_stub_model
+    from test import WalletPersonaGenerator
+
+    data_dir = dataset_dir(args.size, args.seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = load_wallet_data(data_dir)
+    features = list(extract_features_many(sample_wallets(data_dir, args.generator_wallets, args.seed), data).values())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_id = args.model_id or str(build_stub_model(Path(tmp) / "stub-model"))
+        stages = {}
+        generators = {}
+
+        def load(batch_size):
+            generators[batch_size] = WalletPersonaGenerator(
+                model_id=model_id, backend="cpu", max_batch_size=batch_size, cache_size=0
+            )
+
+        stages["generator_load"] = measure(lambda: load(1), 1, memory=False)
+        load(args.generator_batch)
+
+        def sequential():
+            torch.manual_seed(args.seed)
+            for entry in features:
+                generators[1].generate_persona(entry, detailed=False)
+
+        def concurrent():
+            torch.manual_seed(args.seed)
+            generator = generators[args.generator_batch]
+            with ThreadPoolExecutor(max_workers=args.generator_batch) as pool:
+                list(pool.map(lambda entry: generator.generate_persona(entry, detailed=False), features))
+
+        stages["generate_persona"] = measure(sequential, args.repeats, len(features), memory=False)
+        stages["generate_persona_batched"] = measure(concurrent, args.repeats, len(features), memory=False)
+
+    return {
+        "model_id": args.model_id or "stub",
+        "wallets": len(features),
+        "batch_size": args.generator_batch,
+        "stages": stages,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def run_child(args, extra):
+    """Run one benchmark in a subprocess and return its JSON result."""
+    cmd = [
+        sys.executable, __file__,
+        "--size", str(args.size_for_child),
+        "--seed", str(args.seed),
+        "--repeats", str(args.repeats),
+        "--sample", str(args.sample),
+        "--generator-wallets", str(args.generator_wallets),
+        "--generator-batch", str(args.generator_batch),
+        *extra,
+    ]
+    if args.model_id:
+        cmd += ["--model-id", args.model_id]
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=REPO_ROOT)
+    if proc.returncode != 0:
+        error = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+        return {"wallets": args.size_for_child, "error": error}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=REPO_ROOT, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline_path):
+    """Print the ratio of every stage's time to the same stage in a baseline report."""
+    baseline = json.loads(Path(baseline_path).read_text())
+    previous = {
+        (entry.get("wallets"), stage): values["seconds"]
+        for entry in baseline.get("results", []) for stage, values in entry.get("stages", {}).items()
+    }
+    print(f"\nCompared with {baseline_path} ({(baseline.get('meta') or {}).get('git_revision')}):")
+    for entry in report["results"]:
+        for stage, values in entry.get("stages", {}).items():
+            before = previous.get((entry.get("wallets"), stage))
+            if before:
+                print(f"  {entry['wallets']:>9} {stage:<34} {before:10.4f}s -> {values['seconds']:10.4f}s "
+                      f"({values['seconds'] / before:5.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the wallet pipeline on synthetic data")
+    parser.add_argument("--wallets", type=int, nargs="+", default=[1000],
+                        help="Dataset sizes to benchmark, e.g. 1000 100000 1000000")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the datasets and wallet samples")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per stage (best is reported)")
+    parser.add_argument("--sample", type=int, default=200, help="Wallets used by the per-wallet stages")
+    parser.add_argument("--generator", action="store_true",
+                        help="Also benchmark WalletPersonaGenerator with a stub model")
+    parser.add_argument("--model-id", type=str, help="Local model used instead of the generated stub")
+    parser.add_argument("--generator-wallets", type=int, default=8, help="Personas generated per run")
+    parser.add_argument("--generator-batch", type=int, default=8, help="Batch size of the batched generator run")
+    parser.add_argument("--output", type=str, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", type=str, help="Previous results file to compare against")
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--child-generator", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.size is not None:
+        # Child process: benchmark one size (or the generator) and print the result
+        result = run_generator(args) if args.child_generator else run_size(args)
+        print(json.dumps(result))
+        return
+
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "cpu_count": os.cpu_count(),
+            "machine": platform.machine(),
+            "seed": args.seed,
+            "repeats": args.repeats,
+            "sample": args.sample,
+        },
+        "results": [],
+    }
+    for size in args.wallets:
+        print(f"Benchmarking {size} wallets...", file=sys.stderr)
+        args.size_for_child = size
+        report["results"].append(run_child(args, []))
+    if args.generator:
+        print("Benchmarking the persona generator...", file=sys.stderr)
+        args.size_for_child = min(args.wallets)
+        report["generator"] = run_child(args, ["--child-generator"])
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output)
+    if args.baseline:
+        compare(report, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
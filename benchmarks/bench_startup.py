@@ -0,0 +1,148 @@
+"""Measure how fast the API process starts and answers its first requests.
+
+Each run is a fresh interpreter that imports main.py without a Moralis key,
+then sends /api/health and a first /api/wallet/stats request (which loads
+the wallet data) through Flask's test client:
+
+    python benchmarks/bench_startup.py --runs 5
+    python benchmarks/bench_startup.py --max-import-seconds 1.5 --max-first-request-seconds 10
+
+Besides the timings it lists which heavy modules (torch, transformers,
+requests, ...) each step pulled in. Serving stats must not load any of
+them, so the exit status is 1 when one is imported, as it is when a
+--max-* limit is exceeded.
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Modules only persona generation or Moralis fetches should import
+HEAVY_MODULES = ("torch", "transformers", "huggingface_hub", "accelerate", "requests", "moralis")
+
+
+def loaded_heavy_modules():
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def run_once(args):
+    """Import main and send the first requests in this process; returns the timings."""
+    os.environ.pop("MORALIS_API_KEY", None)
+    sys.path.insert(0, str(REPO_ROOT))
+
+    result = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        import main
+        result["import_seconds"] = round(time.perf_counter() - started, 4)
+        result["modules_after_import"] = loaded_heavy_modules()
+
+        client = main.app.test_client()
+        started = time.perf_counter()
+        response = client.get("/api/health")
+        result["health_seconds"] = round(time.perf_counter() - started, 4)
+        result["health_status"] = response.status_code
+
+        started = time.perf_counter()
+        response = client.get("/api/wallet/stats", query_string={
+            "wallet_address": args.wallet, "data_dir": args.data_dir
+        })
+        result["first_stats_seconds"] = round(time.perf_counter() - started, 4)
+        result["first_stats_status"] = response.status_code
+
+        started = time.perf_counter()
+        client.get("/api/wallet/stats", query_string={"wallet_address": args.wallet})
+        result["warm_stats_seconds"] = round(time.perf_counter() - started, 4)
+        result["modules_after_requests"] = loaded_heavy_modules()
+    return result
+
+
+def run_child(args):
+    """Run one measurement in a fresh interpreter and return its JSON result."""
+    cmd = [sys.executable, __file__, "--child", "--data-dir", args.data_dir, "--wallet", args.wallet]
+    env = {key: value for key, value in os.environ.items() if key != "MORALIS_API_KEY"}
+    # Data loaded in the background would not be part of the first request
+    env.pop("EAGER_LOAD", None)
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=REPO_ROOT, env=env)
+    if proc.returncode != 0:
+        error = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+        return {"error": error}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def first_wallet(data_dir):
+    """The first wallet of the data directory's net worth table."""
+    with open(Path(REPO_ROOT, data_dir, "wallet_networth_all_chains.csv"), newline="") as f:
+        return next(csv.DictReader(f))["wallet"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API import and first-request time")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes to start (best is reported)")
+    parser.add_argument("--data-dir", type=str, default="web3_kgenX_new", help="Directory with wallet data")
+    parser.add_argument("--wallet", type=str, help="Wallet of the stats requests (default: the first one)")
+    parser.add_argument("--output", type=str, help="Write the results to this JSON file")
+    parser.add_argument("--max-import-seconds", type=float, help="Fail when importing main takes longer")
+    parser.add_argument("--max-first-request-seconds", type=float,
+                        help="Fail when the first stats request (including the data load) takes longer")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.wallet = args.wallet or first_wallet(args.data_dir)
+
+    if args.child:
+        print(json.dumps(run_once(args)))
+        return
+
+    runs = []
+    for index in range(args.runs):
+        print(f"Starting process {index + 1}/{args.runs}...", file=sys.stderr)
+        runs.append(run_child(args))
+    ok = [run for run in runs if "error" not in run]
+    if not ok:
+        print(json.dumps({"runs": runs}, indent=2))
+        sys.exit(1)
+
+    timings = ("import_seconds", "health_seconds", "first_stats_seconds", "warm_stats_seconds")
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "data_dir": args.data_dir,
+            "runs": args.runs,
+        },
+        "best": {name: min(run[name] for run in ok) for name in timings},
+        "heavy_modules": sorted({name for run in ok for name in run["modules_after_requests"]}),
+        "runs": runs,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output)
+
+    failed = len(ok) < len(runs)
+    if report["heavy_modules"]:
+        print(f"FAIL: serving stats imported {', '.join(report['heavy_modules'])}", file=sys.stderr)
+        failed = True
+    best = report["best"]
+    if args.max_import_seconds is not None and best["import_seconds"] > args.max_import_seconds:
+        print(f"FAIL: import took {best['import_seconds']}s, limit {args.max_import_seconds}s", file=sys.stderr)
+        failed = True
+    if args.max_first_request_seconds is not None and best["first_stats_seconds"] > args.max_first_request_seconds:
+        print(f"FAIL: first stats request took {best['first_stats_seconds']}s, "
+              f"limit {args.max_first_request_seconds}s", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""Offline end-to-end load test of the Flask API.
+
+Boots main.py's app in this process with a fake persona generator, which
+sleeps per token instead of running a model, and points the Moralis client
+at a local stub server. It then drives the stats, analyze, report and fetch
+endpoints with a mix of cache-hit and cache-miss traffic at one or more
+concurrency levels, and reports throughput and latency percentiles:
+
+    python benchmarks/load_test.py --concurrency 1 8 32 --duration 30 --token-delay-ms 2
+    python benchmarks/load_test.py --mix stats=60,analyze=20,report=10,fetch=10 --max-p99 2000
+
+With --max-p99 or --max-error-rate the exit status is 1 when any level
+exceeds the limit, so the script can gate serving changes.
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+OPERATIONS = ("stats", "analyze", "report", "fetch")
+PERCENTILES = (50, 90, 95, 99)
+
+
+def _wallet_number(wallet_address, salt=""):
+    """Deterministic pseudo-random integer derived from a wallet address."""
+    return int(hashlib.sha256(f"{salt}{wallet_address}".encode()).hexdigest()[:8], 16)
+
+
+class StubMoralisHandler(BaseHTTPRequestHandler):
+    """Answers the Moralis endpoints dataLoading calls with small deterministic bodies."""
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        path = self.path.split("?")[0]
+        wallet = next((part for part in path.split("/") if part.startswith("0x")), "0x0")
+        seed = _wallet_number(wallet)
+
+        if path.endswith("/net-worth"):
+            native_usd = seed % 100_000 + 0.5
+            body = {
+                "total_networth_usd": str(native_usd + 100),
+                "chains": [{
+                    "chain": "eth",
+                    "native_balance_formatted": str(native_usd / 2650),
+                    "native_balance_usd": str(native_usd),
+                    "token_balance_usd": "100",
+                    "networth_usd": str(native_usd + 100)
+                }]
+            }
+        elif path.endswith("/tokens"):
+            body = {"result": [
+                {"token_address": f"0x{i:040x}", "symbol": f"TKN{(seed + i) % 500}", "name": f"Token {i}",
+                 "balance_formatted": str(i + 1), "usd_price": 1.0, "usd_value": float(i + 1),
+                 "native_token": i == 0, "verified_contract": i % 2 == 0, "portfolio_percentage": 10.0}
+                for i in range(seed % 20 + 1)
+            ]}
+        elif path.endswith("/stats"):
+            body = {
+                "nfts": str(seed % 50),
+                "collections": str(seed % 20),
+                "transactions": {"total": str(seed % 5000)},
+                "nft_transfers": {"total": str(seed % 300)},
+                "token_transfers": {"total": str(seed % 2000)}
+            }
+        elif path.endswith("/nft/collections"):
+            body = {"result": [
+                {"token_address": f"0x{i:040x}", "contract_type": "ERC721", "name": f"Collection {i}",
+                 "verified_collection": False, "count": 1}
+                for i in range(seed % 5)
+            ]}
+        elif path.endswith("/chains"):
+            body = {"active_chains": [{"chain": "eth", "chain_id": "0x1"}]}
+        else:
+            body = {"result": []}
+
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_stub_moralis(latency_ms):
+    """Serve StubMoralisHandler on a free local port; returns the server."""
+    handler = type("Handler", (StubMoralisHandler,), {"latency": latency_ms / 1000})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-moralis", daemon=True).start()
+    return server
+
+
+def make_fake_generator(token_delay_ms, prefill_ms, max_batch_size, batch_window_ms, cache_size):
+    """A WalletPersonaGenerator whose model is replaced by sleeping.
+
+    Prompting, the persona cache and the micro-batcher are the real ones.
+    One batch runs at a time, as on a single device, and takes prefill_ms
+    plus token_delay_ms per generated token.
+    """
+    from cache import TTLCache
+    from test import PersonaBatcher, WalletPersonaGenerator
+
+    class FakePersonaGenerator(WalletPersonaGenerator):
+        def __init__(self):
+            self.model_id = "fake"
+            self.backend = "fake"
+            self.prefix_cache = {}
+            self._device = threading.Lock()
+            self.batcher = None
+            if max_batch_size > 1:
+                self.batcher = PersonaBatcher(self._generate_batch, batch_window_ms, max_batch_size)
+            self.persona_cache = TTLCache(maxsize=cache_size, ttl=None) if cache_size > 0 else None
+
+        def _generate_batch(self, contents, max_new_tokens, stop_events=None):
+            with self._device:
+                time.sleep((prefill_ms + max_new_tokens * token_delay_ms) / 1000)
+            return [f"## Persona\nFake persona {hashlib.sha256(c.encode()).hexdigest()[:12]}" for c in contents]
+
+        def stream_persona(self, wallet_data, detailed=True, use_cache=True, stop_event=None):
+            yield self.generate_persona(wallet_data, detailed=detailed, use_cache=use_cache)
+
+        def warm_up(self, max_new_tokens=8):
+            return 0.0
+
+    return FakePersonaGenerator()
+
+
+def start_app(args):
+    """Boot main.app with the fake generator and local data; returns (server, base_url)."""
+    from werkzeug.serving import make_server
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        import main
+        main.model_manager.load_data(args.data_dir)
+    main.model_manager.generator = make_fake_generator(
+        args.token_delay_ms, args.prefill_ms, args.max_batch_size, args.batch_window_ms, args.cache_size
+    )
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, main.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="api-server", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}", main
+
+
+def parse_mix(text):
+    """Parse "stats=60,analyze=20,..." into normalised weights per operation."""
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r}, expected one of {', '.join(OPERATIONS)}")
+        weights[name] = float(weight)
+    total = sum(weights.values())
+    if total <= 0:
+        raise argparse.ArgumentTypeError("The traffic mix needs a positive weight")
+    return {name: weight / total for name, weight in weights.items()}
+
+
+class Traffic:
+    """Builds the requests of every operation, for cache hits and misses.
+
+    Hits reuse a small hot set that is requested once before measuring;
+    misses use wallets or options the caches have not seen.
+    """
+
+    def __init__(self, base_url, local_wallets, args):
+        self.base_url = base_url
+        self.local_wallets = local_wallets
+        self.hot_local = local_wallets[:args.hot_wallets]
+        self.hot_remote = [f"0x{'f' * 8}{i:032x}" for i in range(args.hot_wallets)]
+        self.detailed = args.detailed
+        self.job_timeout = args.job_timeout
+        self._unique = iter(range(10 ** 12))
+        self._lock = threading.Lock()
+
+    def fresh_address(self):
+        """An address no cache has seen (and without local data)"""
+        with self._lock:
+            number = next(self._unique)
+        return f"0x{'e' * 8}{number:032x}"
+
+    def pick_wallet(self, operation, hit, rng):
+        if operation == "stats":
+            return rng.choice(self.local_wallets) if hit else self.fresh_address()
+        if operation == "fetch":
+            return rng.choice(self.hot_remote) if hit else self.fresh_address()
+        return rng.choice(self.hot_local) if hit else rng.choice(self.local_wallets)
+
+    def run(self, session, operation, wallet, hit=True):
+        """Send one request; returns the HTTP status of the operation."""
+        url = self.base_url
+        if operation == "stats":
+            return session.get(f"{url}/api/wallet/stats", params={"wallet_address": wallet}).status_code
+        if operation == "fetch":
+            return session.post(f"{url}/api/wallet/fetch", json={"wallet_address": wallet}).status_code
+        body = {"wallet_address": wallet, "detailed": self.detailed, "bypass_cache": not hit}
+        if operation == "analyze":
+            return session.post(f"{url}/api/wallet/analyze", json=body).status_code
+
+        # report: submit the job and long-poll until it is done
+        response = session.post(f"{url}/api/wallet/report", json=body)
+        if response.status_code != 202:
+            return response.status_code
+        job_url = url + response.json()["status_url"]
+        deadline = time.monotonic() + self.job_timeout
+        while time.monotonic() < deadline:
+            job = session.get(job_url, params={"wait": min(30, self.job_timeout)})
+            if job.status_code != 200:
+                return job.status_code
+            status = job.json().get("status")
+            if status == "done":
+                return 200
+            if status == "failed":
+                return 500
+        return 504
+
+    def warm_up(self, session):
+        """Request the hot set once so hit traffic finds it cached."""
+        for wallet in self.hot_local:
+            self.run(session, "analyze", wallet)
+            self.run(session, "report", wallet)
+        for wallet in self.hot_remote:
+            self.run(session, "fetch", wallet)
+
+
+def summarize(samples, duration):
+    """Throughput, error count and latency percentiles (ms) of (latency, status) samples."""
+    if not samples:
+        return {"requests": 0}
+    latencies = np.array([latency for latency, _ in samples]) * 1000
+    errors = sum(1 for _, status in samples if status >= 400)
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / duration, 2),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4),
+        "latency_ms": {
+            **{f"p{p}": round(float(np.percentile(latencies, p)), 2) for p in PERCENTILES},
+            "mean": round(float(latencies.mean()), 2),
+            "max": round(float(latencies.max()), 2),
+        },
+    }
+
+
+def run_level(traffic, concurrency, args):
+    """Drive the API with `concurrency` closed-loop clients for args.duration seconds."""
+    import requests
+
+    samples = []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + args.duration
+    operations = list(args.mix)
+    weights = [args.mix[name] for name in operations]
+
+    def client(index):
+        rng = random.Random(args.seed * 1000 + index)
+        session = requests.Session()
+        local = []
+        while time.monotonic() < stop_at:
+            operation = rng.choices(operations, weights)[0]
+            hit = rng.random() < args.hit_ratio
+            wallet = traffic.pick_wallet(operation, hit, rng)
+            started = time.perf_counter()
+            try:
+                status = traffic.run(session, operation, wallet, hit)
+            except requests.RequestException:
+                status = 599
+            local.append((operation, "hit" if hit else "miss", time.perf_counter() - started, status))
+        with lock:
+            samples.extend(local)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.monotonic() - started
+
+    result = {"concurrency": concurrency, "duration": round(duration, 2)}
+    result.update(summarize([(latency, status) for _, _, latency, status in samples], duration))
+    result["operations"] = {}
+    for operation in operations:
+        entries = [sample for sample in samples if sample[0] == operation]
+        result["operations"][operation] = {
+            **summarize([(latency, status) for _, _, latency, status in entries], duration),
+            **{
+                kind: summarize([(latency, status) for _, k, latency, status in entries if k == kind], duration)
+                for kind in ("hit", "miss")
+            }
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the wallet persona API")
+    parser.add_argument("--data-dir", type=str, default="web3_kgenX_new", help="Directory with wallet data")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32],
+                        help="Concurrent clients; each level runs for --duration seconds")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per concurrency level")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("stats=50,analyze=20,report=10,fetch=20"),
+                        help="Relative weight of each operation")
+    parser.add_argument("--hit-ratio", type=float, default=0.8,
+                        help="Share of requests for wallets the caches already hold")
+    parser.add_argument("--hot-wallets", type=int, default=20, help="Wallets requested by cache-hit traffic")
+    parser.add_argument("--detailed", action="store_true", help="Request detailed (800 token) personas")
+    parser.add_argument("--token-delay-ms", type=float, default=1.0, help="Fake generation time per token")
+    parser.add_argument("--prefill-ms", type=float, default=20.0, help="Fake prefill time per batch")
+    parser.add_argument("--max-batch-size", type=int, default=8, help="Personas generated per fake batch")
+    parser.add_argument("--batch-window-ms", type=float, default=25, help="Micro-batching window")
+    parser.add_argument("--cache-size", type=int, default=256, help="Persona cache size of the fake generator")
+    parser.add_argument("--moralis-latency-ms", type=float, default=50.0, help="Latency of the stub Moralis server")
+    parser.add_argument("--job-timeout", type=float, default=120, help="Seconds to wait for a report job")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the traffic generator")
+    parser.add_argument("--output", type=str, help="Write the results to this JSON file")
+    parser.add_argument("--max-p99", type=float, help="Fail when a level's p99 latency exceeds this many ms")
+    parser.add_argument("--max-error-rate", type=float, help="Fail when a level's error rate exceeds this share")
+    args = parser.parse_args()
+
+    stub = start_stub_moralis(args.moralis_latency_ms)
+    os.environ["MORALIS_BASE_URL"] = f"http://127.0.0.1:{stub.server_port}"
+    os.environ.setdefault("MORALIS_API_KEY", "load-test")
+
+    import requests
+
+    server, base_url, app_module = start_app(args)
+    networth = app_module.model_manager.data_dict["networth"]
+    local_wallets = sorted(str(wallet) for wallet in networth["wallet"].dropna().unique())
+    rng = random.Random(args.seed)
+    rng.shuffle(local_wallets)
+    traffic = Traffic(base_url, local_wallets, args)
+
+    report = {"config": {key: value for key, value in vars(args).items() if key != "output"}, "levels": []}
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        traffic.warm_up(requests.Session())
+        for concurrency in args.concurrency:
+            print(f"Running {concurrency} concurrent clients for {args.duration}s...", file=sys.stderr)
+            report["levels"].append(run_level(traffic, concurrency, args))
+
+    server.shutdown()
+    stub.shutdown()
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output)
+
+    failed = False
+    for level in report["levels"]:
+        p99 = level.get("latency_ms", {}).get("p99")
+        if args.max_p99 is not None and p99 is not None and p99 > args.max_p99:
+            print(f"FAIL: p99 {p99}ms at concurrency {level['concurrency']} exceeds {args.max_p99}ms", file=sys.stderr)
+            failed = True
+        if args.max_error_rate is not None and level.get("error_rate", 0) > args.max_error_rate:
+            print(f"FAIL: error rate {level['error_rate']} at concurrency {level['concurrency']} exceeds "
+                  f"{args.max_error_rate}", file=sys.stderr)
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
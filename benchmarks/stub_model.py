@@ -0,0 +1,69 @@
+"""Build a tiny randomly initialised Mistral model for benchmarks.
+
+The model has the architecture and chat template of the persona model but
+only two small layers, so WalletPersonaGenerator can be benchmarked end to
+end (prompting, tokenization, batching, prefix cache, generation) in
+seconds and without downloading weights. Its output is gibberish.
+"""
+import argparse
+from pathlib import Path
+
+CHAT_TEMPLATE = "{{ bos_token }}{% for m in messages %}[INST] {{ m['content'] }} [/INST]{% endfor %}"
+
+
+def build_stub_model(out_dir, hidden_size=64, layers=2, seed=0):
+    """Write a character-level tokenizer and a tiny Mistral model to out_dir.
+
+    Args:
+        out_dir: Directory to save the model to (loadable with from_pretrained)
+        hidden_size: Hidden size of the model
+        layers: Number of decoder layers
+        seed: Seed of the random weights
+
+    Returns:
+        out_dir as a Path
+    """
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from transformers import MistralConfig, MistralForCausalLM, PreTrainedTokenizerFast
+
+    out_dir = Path(out_dir)
+    vocab = {"<unk>": 0, "<s>": 1, "</s>": 2}
+    for char in [chr(i) for i in range(32, 127)] + ["\n"]:
+        vocab.setdefault(char, len(vocab))
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Split("", "isolated")
+    tokenizer.decoder = decoders.Fuse()
+    fast_tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, bos_token="<s>", eos_token="</s>", unk_token="<unk>"
+    )
+    fast_tokenizer.chat_template = CHAT_TEMPLATE
+    fast_tokenizer.save_pretrained(out_dir)
+
+    torch.manual_seed(seed)
+    config = MistralConfig(
+        vocab_size=len(vocab),
+        hidden_size=hidden_size,
+        intermediate_size=hidden_size * 2,
+        num_hidden_layers=layers,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=4096,
+        bos_token_id=1,
+        eos_token_id=2
+    )
+    MistralForCausalLM(config).save_pretrained(out_dir)
+    return out_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a tiny stub model for benchmarks")
+    parser.add_argument("--out", type=str, required=True, help="Directory to save the model to")
+    parser.add_argument("--hidden-size", type=int, default=64, help="Hidden size of the model")
+    parser.add_argument("--layers", type=int, default=2, help="Number of decoder layers")
+    args = parser.parse_args()
+    print(f"Stub model written to {build_stub_model(args.out, args.hidden_size, args.layers)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Generate a synthetic wallet dataset in the schemas of web3_kgenX_new/.
+
+Writes the five tables load_wallet_data reads plus wallets.csv. The same
+seed and size always produce the same files, so benchmark runs on
+different commits see identical data:
+
+    python benchmarks/synthetic_data.py --wallets 100000 --out benchmarks/.data/100000
+
+Distributions follow the bundled data: tokens per wallet are log-normal
+with a median of about 23 and capped at the 100 tokens of one Moralis page,
+balances and activity counts are heavy-tailed, and a minority of wallets
+hold balances on several chains or DeFi positions.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from dataLoading import TABLE_FILES
+
+# Chains and the USD price of their native token
+CHAIN_PRICES = {"eth": 2650.0, "polygon": 0.7, "bsc": 600.0, "arbitrum": 2650.0, "base": 2650.0}
+# Share of wallets with balances on 1, 2 and 3 chains
+CHAIN_COUNT_WEIGHTS = (0.8, 0.15, 0.05)
+# The Moralis token endpoint returns at most one page of 100 tokens
+MAX_TOKENS_PER_WALLET = 100
+TOKEN_UNIVERSE = 20_000
+DEFI_SHARE = 0.05
+DEFI_PROTOCOLS = (("Uniswap v2", "uniswap-v2"), ("Uniswap v3", "uniswap-v3"), ("Aave v3", "aave-v3"),
+                  ("Lido", "lido"), ("Curve", "curve"))
+# NFT collection rows per wallet (the bundled data has about 9.5)
+NFT_ROWS_PER_WALLET = 9
+# Wallets generated and written at a time, bounding memory for large sizes
+CHUNK_WALLETS = 50_000
+
+
+def _hex_ids(rng, count, width=40):
+    """count random 0x-prefixed hex strings of width digits."""
+    raw = rng.bytes(count * width // 2).hex()
+    return np.array(["0x" + raw[i * width:(i + 1) * width] for i in range(count)], dtype=object)
+
+
+def _token_catalog(rng):
+    """Symbols, names, contract addresses and prices of the shared token universe."""
+    symbols = np.array([f"TKN{i}" for i in range(TOKEN_UNIVERSE)], dtype=object)
+    return {
+        "address": _hex_ids(rng, TOKEN_UNIVERSE),
+        "symbol": symbols,
+        "name": np.array([f"Token {i}" for i in range(TOKEN_UNIVERSE)], dtype=object),
+        "price": rng.lognormal(mean=-6, sigma=4, size=TOKEN_UNIVERSE),
+        "verified": rng.random(TOKEN_UNIVERSE) < 0.2,
+        # Zipf-like popularity: a few tokens are held by many wallets
+        "weights": (1 / np.arange(1, TOKEN_UNIVERSE + 1) ** 1.1),
+    }
+
+
+def _networth_rows(rng, wallets):
+    chain_counts = rng.choice(len(CHAIN_COUNT_WEIGHTS), size=len(wallets), p=CHAIN_COUNT_WEIGHTS) + 1
+    wallet_col = np.repeat(wallets, chain_counts)
+    chain_names = np.array(list(CHAIN_PRICES), dtype=object)
+    # eth first, further chains drawn from the others
+    offsets = np.concatenate([np.arange(count) for count in chain_counts])
+    extra = rng.integers(1, len(chain_names), size=len(wallet_col))
+    chains = np.where(offsets == 0, chain_names[0], chain_names[extra])
+    prices = np.array([CHAIN_PRICES[chain] for chain in chains])
+    native = rng.lognormal(mean=3, sigma=3, size=len(wallet_col))
+    token_usd = np.where(rng.random(len(wallet_col)) < 0.4, rng.lognormal(mean=6, sigma=4, size=len(wallet_col)), 0.0)
+    chain_usd = native * prices + token_usd
+    totals = pd.Series(chain_usd).groupby(np.repeat(np.arange(len(wallets)), chain_counts)).transform("sum")
+    return pd.DataFrame({
+        "wallet": wallet_col,
+        "chain": chains,
+        "native_balance": native.round(6),
+        "native_balance_usd": (native * prices).round(2),
+        "token_balance_usd": token_usd.round(2),
+        "chain_networth_usd": chain_usd.round(2),
+        "total_networth_usd": totals.to_numpy().round(2),
+    })
+
+
+def _token_rows(rng, wallets, catalog):
+    counts = np.clip(np.round(rng.lognormal(mean=np.log(23), sigma=1.5, size=len(wallets))), 1, MAX_TOKENS_PER_WALLET)
+    counts = counts.astype(int)
+    weights = catalog["weights"][1:]
+    # Token 0 is the native token every wallet holds; the others are drawn by
+    # popularity. Draws are oversampled and de-duplicated per wallet, then cut
+    # back to the wallet's token count.
+    draws = np.ceil(counts * 1.5).astype(int) + 2
+    owner = np.repeat(np.arange(len(wallets)), draws)
+    candidates = pd.DataFrame({
+        "owner": owner,
+        "token": rng.choice(np.arange(1, TOKEN_UNIVERSE), size=len(owner), p=weights / weights.sum()),
+    }).drop_duplicates()
+    candidates = candidates[candidates.groupby("owner").cumcount() < counts[candidates["owner"].to_numpy()] - 1]
+    picks_df = pd.concat([pd.DataFrame({"owner": np.arange(len(wallets)), "token": 0}), candidates])
+    picks_df = picks_df.sort_values("owner", kind="stable")
+    owner = picks_df["owner"].to_numpy()
+    picks = picks_df["token"].to_numpy()
+    rows = len(picks)
+    usd_value = rng.lognormal(mean=0, sigma=5, size=rows)
+    usd_price = np.where(picks == 0, CHAIN_PRICES["eth"], catalog["price"][picks])
+    wallet_col = wallets[owner]
+    portfolio = pd.Series(usd_value).groupby(owner).transform("sum").to_numpy()
+    return pd.DataFrame({
+        "wallet": wallet_col,
+        "token_address": np.where(picks == 0, "0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee", catalog["address"][picks]),
+        "token_symbol": np.where(picks == 0, "ETH", catalog["symbol"][picks]),
+        "token_name": np.where(picks == 0, "Ether", catalog["name"][picks]),
+        "balance": usd_value / usd_price,
+        "usd_price": usd_price,
+        "usd_value": usd_value,
+        "native_token": picks == 0,
+        "verified_contract": (picks == 0) | catalog["verified"][picks],
+        "portfolio_pct": usd_value / portfolio * 100,
+    })
+
+
+def _defi_rows(rng, wallets):
+    holders = wallets[rng.random(len(wallets)) < DEFI_SHARE]
+    # Every position holds a token pair
+    positions = rng.integers(1, 4, size=len(holders))
+    wallet_col = np.repeat(holders, positions * 2)
+    rows = len(wallet_col)
+    protocol = rng.integers(0, len(DEFI_PROTOCOLS), size=rows // 2).repeat(2)
+    usd_value = rng.lognormal(mean=5, sigma=2, size=rows)
+    usd_price = rng.lognormal(mean=2, sigma=3, size=rows)
+    pair_usd = (usd_value[0::2] + usd_value[1::2]).repeat(2)
+    return pd.DataFrame({
+        "wallet": wallet_col,
+        "protocol_name": [DEFI_PROTOCOLS[i][0] for i in protocol],
+        "protocol_id": [DEFI_PROTOCOLS[i][1] for i in protocol],
+        "token_name": np.where(np.arange(rows) % 2 == 0, "Wrapped Ether", "Tether USD"),
+        "token_symbol": np.where(np.arange(rows) % 2 == 0, "WETH", "USDT"),
+        "contract_address": np.where(np.arange(rows) % 2 == 0, "0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2",
+                                     "0xdac17f958d2ee523a2206206994597c13d831ec7"),
+        "balance": usd_value / usd_price,
+        "usd_price": usd_price,
+        "usd_value": usd_value,
+        "position_label": "liquidity",
+        "balance_usd": pair_usd,
+        "unclaimed_usd": np.nan,
+        "position_address": _hex_ids(rng, rows // 2).repeat(2),
+    })
+
+
+def _stats_rows(rng, wallets):
+    size = len(wallets)
+    nfts = np.floor(rng.lognormal(mean=0.7, sigma=2.2, size=size)).astype(np.int64)
+    return pd.DataFrame({
+        "wallet": wallets,
+        "nfts": nfts,
+        "collections": np.floor(nfts * rng.uniform(0.3, 1.0, size=size)).astype(np.int64),
+        "transactions_total": np.floor(rng.lognormal(mean=4, sigma=3, size=size)).astype(np.int64),
+        "nft_transfers_total": np.floor(rng.lognormal(mean=2, sigma=3, size=size)).astype(np.int64),
+        "token_transfers_total": np.floor(rng.lognormal(mean=3.6, sigma=3, size=size)).astype(np.int64),
+    })
+
+
+def _nft_rows(rng, wallets):
+    rows = len(wallets) * NFT_ROWS_PER_WALLET
+    return pd.DataFrame({
+        "token_address": _hex_ids(rng, rows),
+        "contract_type": np.where(rng.random(rows) < 0.8, "ERC721", "ERC1155"),
+        "name": [f"Collection {i}" for i in rng.integers(0, 1_000_000, size=rows)],
+        "verified_collection": rng.random(rows) < 0.1,
+        "count": np.floor(rng.lognormal(mean=0, sigma=1, size=rows)).astype(np.int64),
+    })
+
+
+def generate_dataset(out_dir, wallets, seed=0):
+    """Write a synthetic dataset of `wallets` wallets to out_dir.
+
+    Args:
+        out_dir: Directory to write the CSVs to (created if missing)
+        wallets: Number of wallets
+        seed: Random seed; equal seeds and sizes give identical files
+
+    Returns:
+        Dict of table name -> rows written
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    catalog = _token_catalog(rng)
+    files = dict(TABLE_FILES, wallets="wallets.csv")
+    builders = {
+        "networth": lambda chunk: _networth_rows(rng, chunk),
+        "tokens": lambda chunk: _token_rows(rng, chunk, catalog),
+        "defi": lambda chunk: _defi_rows(rng, chunk),
+        "nfts": lambda chunk: _nft_rows(rng, chunk),
+        "stats": lambda chunk: _stats_rows(rng, chunk),
+        "wallets": lambda chunk: pd.DataFrame({"wallet_ID": chunk}),
+    }
+
+    rows = dict.fromkeys(files, 0)
+    for start in range(0, wallets, CHUNK_WALLETS):
+        chunk = _hex_ids(rng, min(CHUNK_WALLETS, wallets - start))
+        for name, build in builders.items():
+            df = build(chunk)
+            df.to_csv(out_dir / files[name], mode="w" if start == 0 else "a", header=start == 0, index=False)
+            rows[name] += len(df)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic wallet dataset")
+    parser.add_argument("--wallets", type=int, default=1000, help="Number of wallets")
+    parser.add_argument("--out", type=str, required=True, help="Directory to write the CSVs to")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rows = generate_dataset(args.out, args.wallets, args.seed)
+    print(f"Wrote {args.wallets} wallets to {args.out} in {time.perf_counter() - started:.1f}s: {rows}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,141 +1,863 @@
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from moralis import evm_api
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import hashlib
+import json
+import operator
 import os
+import time
 from dotenv import load_dotenv
+from cache import TTLCache
+import metrics
 
 load_dotenv()
 
-MORALIS_API_KEY = os.getenv("MORALIS_API_KEY")
-if not MORALIS_API_KEY:
-    raise ValueError("MORALIS_API_KEY not found in environment variables. Please create a .env file with your API key.")
+# Moralis REST API root; point MORALIS_BASE_URL at a stub server for offline runs
+DEFAULT_MORALIS_BASE_URL = "https://deep-index.moralis.io/api/v2.2"
+# Per-call timeout in seconds
+MORALIS_TIMEOUT = float(os.getenv("MORALIS_TIMEOUT", "10"))
+# Threads shared by all concurrent Moralis calls in this process
+MORALIS_MAX_WORKERS = int(os.getenv("MORALIS_MAX_WORKERS", "16"))
 
+# Moralis response cache keyed by (wallet, chain, endpoint)
+moralis_cache = TTLCache(
+    maxsize=int(os.getenv("MORALIS_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("MORALIS_CACHE_TTL", "300")),
+    path=os.getenv("MORALIS_CACHE_PATH") or None,
+)
 
-def fetch_wallet_data_from_api(wallet_address):
-    """Fetch wallet data from Moralis API for a single wallet."""
+_http_session = None
+_fetch_pool = None
+_http_lock = Lock()
+
+
+def moralis_api_key():
+    """Return the Moralis API key, raising when it is not configured.
+
+    Checked when the first Moralis call is made, so processes that only
+    serve local data run without a key.
+    """
+    api_key = os.getenv("MORALIS_API_KEY")
+    if not api_key:
+        raise ValueError("MORALIS_API_KEY not found in environment variables. Please create a .env file with your API key.")
+    return api_key
+
+
+def get_http_session():
+    """Return the keep-alive HTTP session shared by all Moralis calls."""
+    global _http_session
+    with _http_lock:
+        if _http_session is None:
+            # Imported here so processes that never call Moralis don't pay for it
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MORALIS_MAX_WORKERS)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Accept": "application/json", "X-API-Key": moralis_api_key()})
+            _http_session = session
+        return _http_session
+
+
+def get_fetch_pool():
+    """Return the thread pool that runs Moralis calls concurrently."""
+    global _fetch_pool
+    with _http_lock:
+        if _fetch_pool is None:
+            _fetch_pool = ThreadPoolExecutor(max_workers=MORALIS_MAX_WORKERS, thread_name_prefix="moralis")
+        return _fetch_pool
+
+
+def moralis_get(path, params=None, timeout=None):
+    """GET a Moralis endpoint and return the decoded JSON body."""
+    base_url = os.getenv("MORALIS_BASE_URL", DEFAULT_MORALIS_BASE_URL).rstrip("/")
+    # Moralis expects lowercase booleans in query strings
+    query = {key: str(value).lower() if isinstance(value, bool) else value for key, value in (params or {}).items()}
+    response = get_http_session().get(base_url + path, params=query, timeout=timeout or MORALIS_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def cached_moralis_get(endpoint, wallet_address, chain, path, params=None, timeout=None, use_cache=True):
+    """GET a Moralis endpoint through moralis_cache.
+
+    Args:
+        use_cache: False always calls Moralis and leaves moralis_cache untouched
+    """
+    key = (wallet_address.lower(), chain, endpoint)
+    if use_cache:
+        result = moralis_cache.get(key)
+        if result is not None:
+            metrics.count("cache_hits_total", cache="moralis")
+            return result
+        metrics.count("cache_misses_total", cache="moralis")
+    started = time.perf_counter()
     try:
-        api_key = MORALIS_API_KEY
-        data = {}
+        result = moralis_get(path, params, timeout)
+    except Exception:
+        metrics.count("errors_total", stage="moralis", endpoint=endpoint)
+        raise
+    finally:
+        metrics.observe("moralis_request_seconds", time.perf_counter() - started, endpoint=endpoint)
+    if use_cache:
+        moralis_cache.set(key, result)
+    return result
 
-        # Get token balances
-        token_params = {
-            "chain": "eth",
-            "address": wallet_address
-        }
-        token_result = evm_api.wallets.get_wallet_token_balances_price(
-            api_key=api_key,
-            params=token_params,
-        )
-        data["tokens"] = pd.DataFrame(token_result.get("result", []))
-
-        # Get net worth
-        networth_params = {
-            "exclude_spam": True,
-            "exclude_unverified_contracts": True,
-            "max_token_inactivity": 1,
-            "min_pair_side_liquidity_usd": 1000,
-            "address": wallet_address
-        }
-        networth_result = evm_api.wallets.get_wallet_net_worth(
-            api_key=api_key,
-            params=networth_params,
-        )
-        networth_data = []
-        total_usd = networth_result.get("total_networth_usd", 0)
-        for chain_data in networth_result.get("chains", []):
-            networth_data.append({
+
+def fetch_token_rows(wallet_address, chain="eth", timeout=None, use_cache=True):
+    """Fetch a wallet's token balances as rows of token_balances.csv."""
+    result = cached_moralis_get("tokens", wallet_address, chain, f"/wallets/{wallet_address}/tokens",
+                                {"chain": chain}, timeout, use_cache=use_cache)
+    return [{
+        "wallet": wallet_address,
+        "token_address": token.get("token_address"),
+        "token_symbol": token.get("symbol"),
+        "token_name": token.get("name"),
+        "balance": token.get("balance_formatted"),
+        "usd_price": token.get("usd_price"),
+        "usd_value": token.get("usd_value"),
+        "native_token": token.get("native_token"),
+        "verified_contract": token.get("verified_contract"),
+        "portfolio_pct": token.get("portfolio_percentage")
+    } for token in result.get("result", [])]
+
+
+def fetch_networth_rows(wallet_address, timeout=None, use_cache=True):
+    """Fetch a wallet's net worth as rows of wallet_networth_all_chains.csv."""
+    params = {
+        "exclude_spam": True,
+        "exclude_unverified_contracts": True,
+        "max_token_inactivity": 1,
+        "min_pair_side_liquidity_usd": 1000
+    }
+    result = cached_moralis_get("networth", wallet_address, "all", f"/wallets/{wallet_address}/net-worth",
+                                params, timeout, use_cache=use_cache)
+    total_usd = result.get("total_networth_usd", 0)
+    return [{
+        "wallet": wallet_address,
+        "chain": chain_data.get("chain"),
+        "native_balance": chain_data.get("native_balance_formatted"),
+        "native_balance_usd": chain_data.get("native_balance_usd"),
+        "token_balance_usd": chain_data.get("token_balance_usd"),
+        "chain_networth_usd": chain_data.get("networth_usd"),
+        "total_networth_usd": total_usd
+    } for chain_data in result.get("chains", [])]
+
+
+def fetch_stats_rows(wallet_address, chain="eth", timeout=None, use_cache=True):
+    """Fetch a wallet's activity stats as rows of wallet_stats.csv."""
+    result = cached_moralis_get("stats", wallet_address, chain, f"/wallets/{wallet_address}/stats",
+                                {"chain": chain}, timeout, use_cache=use_cache)
+    return [{
+        "wallet": wallet_address,
+        "nfts": result.get("nfts", ""),
+        "collections": result.get("collections", ""),
+        "transactions_total": result.get("transactions", {}).get("total", ""),
+        "nft_transfers_total": result.get("nft_transfers", {}).get("total", ""),
+        "token_transfers_total": result.get("token_transfers", {}).get("total", ""),
+    }]
+
+
+def fetch_nft_rows(wallet_address, chain="eth", timeout=None, use_cache=True):
+    """Fetch a wallet's NFT collections."""
+    result = cached_moralis_get("nfts", wallet_address, chain, f"/{wallet_address}/nft/collections",
+                                {"chain": chain}, timeout, use_cache=use_cache)
+    collections = result.get("result", [])
+    if isinstance(collections, dict):
+        collections = [collections]
+    return [{
+        "wallet_address": wallet_address,
+        "token_address": col.get("token_address", ""),
+        "contract_type": col.get("contract_type", ""),
+        "name": col.get("name", ""),
+        "verified_collection": col.get("verified_collection", ""),
+        "count": col.get("count", 0)
+    } for col in collections]
+
+
+def fetch_defi_rows(wallet_address, protocol="uniswap-v2", chain="eth", timeout=None, use_cache=True):
+    """Fetch a wallet's positions in one DeFi protocol as rows of defi_positions.csv."""
+    result = cached_moralis_get(f"defi:{protocol}", wallet_address, chain,
+                                f"/wallets/{wallet_address}/defi/{protocol}/positions", {"chain": chain}, timeout,
+                                use_cache=use_cache)
+    rows = []
+    for pos in result.get("positions", []):
+        for token in pos.get("tokens", []):
+            rows.append({
                 "wallet": wallet_address,
-                "chain": chain_data.get("chain"),
-                "native_balance": chain_data.get("native_balance_formatted"),
-                "native_balance_usd": chain_data.get("native_balance_usd"),
-                "token_balance_usd": chain_data.get("token_balance_usd"),
-                "chain_networth_usd": chain_data.get("networth_usd"),
-                "total_networth_usd": total_usd
+                "protocol_name": result.get("protocol_name"),
+                "protocol_id": result.get("protocol_id"),
+                "token_name": token.get("name"),
+                "token_symbol": token.get("symbol"),
+                "contract_address": token.get("contract_address"),
+                "balance": token.get("balance_formatted"),
+                "usd_price": token.get("usd_price"),
+                "usd_value": token.get("usd_value"),
+                "position_label": pos.get("label"),
+                "balance_usd": pos.get("balance_usd"),
+                "unclaimed_usd": pos.get("total_unclaimed_usd_value"),
+                "position_address": pos.get("address")
             })
-        data["networth"] = pd.DataFrame(networth_data)
+    return rows
 
-        # Get wallet stats
-        stats_params = {
-            "chain": "eth",
-            "address": wallet_address
-        }
-        stats_result = evm_api.wallets.get_wallet_stats(
-            api_key=api_key,
-            params=stats_params,
-        )
-        stats_data = [{
+
+def fetch_active_chain_rows(wallet_address, timeout=None, use_cache=True):
+    """Fetch the chains a wallet is active on as rows of wallet_active_chains.csv."""
+    result = cached_moralis_get("active_chains", wallet_address, "all", f"/wallets/{wallet_address}/chains",
+                                None, timeout, use_cache=use_cache)
+    active_chains = result.get("active_chains", [])
+    if isinstance(active_chains, dict):
+        active_chains = [active_chains]
+    rows = []
+    for chain_info in active_chains:
+        first_tx = chain_info.get("first_transaction") or {}
+        last_tx = chain_info.get("last_transaction") or {}
+        rows.append({
             "wallet": wallet_address,
-            "nfts": stats_result.get("nfts", ""),
-            "collections": stats_result.get("collections", ""),
-            "transactions_total": stats_result.get("transactions", {}).get("total", ""),
-            "nft_transfers_total": stats_result.get("nft_transfers", {}).get("total", ""),
-            "token_transfers_total": stats_result.get("token_transfers", {}).get("total", ""),
-        }]
-        data["stats"] = pd.DataFrame(stats_data)
-
-        # Get NFT collections
-        nft_params = {
-            "chain": "eth",
-            "address": wallet_address
-        }
-        nft_result = evm_api.nft.get_wallet_nft_collections(
-            api_key=api_key,
-            params=nft_params
-        )
-        collections = nft_result.get("result", [])
-        if isinstance(collections, dict):
-            collections = [collections]
-        nft_data = []
-        for col in collections:
-            nft_data.append({
-                "wallet_address": wallet_address,
-                "token_address": col.get("token_address", ""),
-                "contract_type": col.get("contract_type", ""),
-                "name": col.get("name", ""),
-                "verified_collection": col.get("verified_collection", ""),
-                "count": col.get("count", 0)
-            })
-        data["nfts"] = pd.DataFrame(nft_data)
+            "chain": chain_info.get("chain"),
+            "chain_id": chain_info.get("chain_id"),
+            "first_tx_block": first_tx.get("block_number"),
+            "first_tx_time": first_tx.get("block_timestamp"),
+            "first_tx_hash": first_tx.get("transaction_hash"),
+            "last_tx_block": last_tx.get("block_number"),
+            "last_tx_time": last_tx.get("block_timestamp"),
+            "last_tx_hash": last_tx.get("transaction_hash"),
+        })
+    return rows
 
-        return data
 
-    except Exception as e:
-        print(f"Error fetching data from Moralis API: {e}")
+def fetch_wallet_data_from_api(wallet_address, chain="eth", timeout=None):
+    """Fetch wallet data from Moralis API for a single wallet.
+
+    The token, net worth, stats and NFT calls run concurrently over a shared
+    keep-alive session, each with its own timeout. An endpoint that fails
+    yields an empty table and is listed under "errors"; None is returned only
+    when every endpoint fails.
+    """
+    fetchers = {
+        "tokens": lambda: fetch_token_rows(wallet_address, chain, timeout),
+        "networth": lambda: fetch_networth_rows(wallet_address, timeout),
+        "stats": lambda: fetch_stats_rows(wallet_address, chain, timeout),
+        "nfts": lambda: fetch_nft_rows(wallet_address, chain, timeout),
+    }
+    pool = get_fetch_pool()
+    futures = {name: pool.submit(fetch) for name, fetch in fetchers.items()}
+
+    data = {}
+    errors = {}
+    for name, future in futures.items():
+        try:
+            data[name] = pd.DataFrame(future.result())
+        except Exception as e:
+            print(f"Error fetching {name} from Moralis API: {e}")
+            data[name] = pd.DataFrame()
+            errors[name] = str(e)
+
+    if len(errors) == len(fetchers):
         return None
+    data["errors"] = errors
+    data["source"] = "api"
+    return data
+
+
+# CSV file backing each table of the wallet data dict
+TABLE_FILES = {
+    "networth": "wallet_networth_all_chains.csv",
+    "tokens": "token_balances.csv",
+    "defi": "defi_positions.csv",
+    "nfts": "nft_collections_cleaned.csv",
+    "stats": "wallet_stats.csv",
+}
+
+# Column types applied to every loaded table. Integer and boolean columns that
+# contain missing values keep the type pandas inferred for them.
+TABLE_SCHEMAS = {
+    "networth": {
+        "wallet": "category",
+        "chain": "category",
+        "native_balance": "float64",
+        "native_balance_usd": "float64",
+        "token_balance_usd": "float64",
+        "chain_networth_usd": "float64",
+        "total_networth_usd": "float64",
+    },
+    "tokens": {
+        "wallet": "category",
+        "balance": "float64",
+        "usd_price": "float64",
+        "usd_value": "float64",
+        "native_token": "bool",
+        "verified_contract": "bool",
+        "portfolio_pct": "float64",
+    },
+    "defi": {
+        "wallet": "category",
+        "balance": "float64",
+        "usd_price": "float64",
+        "usd_value": "float64",
+        "balance_usd": "float64",
+        "unclaimed_usd": "float64",
+    },
+    "nfts": {
+        "verified_collection": "bool",
+        "count": "int64",
+    },
+    "stats": {
+        "wallet": "category",
+        "nfts": "int64",
+        "collections": "int64",
+        "transactions_total": "int64",
+        "nft_transfers_total": "int64",
+        "token_transfers_total": "int64",
+    },
+}
+
+# Bump when TABLE_SCHEMAS changes so existing columnar caches are rebuilt
+CACHE_SCHEMA_VERSION = 1
+
+
+def apply_table_schema(df, name):
+    """Cast the columns of a loaded table to the types in TABLE_SCHEMAS."""
+    for column, dtype in TABLE_SCHEMAS.get(name, {}).items():
+        if column not in df.columns:
+            continue
+        values = df[column]
+        if dtype == "bool" and values.dtype == object:
+            values = values.astype(str).str.lower().map({"true": True, "false": False})
+        if dtype in ("int64", "bool") and values.isna().any():
+            continue
+        try:
+            df[column] = values.astype(dtype)
+        except (TypeError, ValueError):
+            print(f"Could not convert {name}.{column} to {dtype}, keeping {df[column].dtype}")
+    return df
+
 
-def load_wallet_data(data_dir="web3_kgenX_new"):
-    """Load and combine wallet data from CSV files."""
+def _read_csv_table(path, name):
+    """Parse one wallet CSV and apply its schema."""
+    df = pd.read_csv(path)
+    return apply_table_schema(df.fillna(np.nan), name)
+
+
+def _file_digest(path):
+    """Return the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_table_cached(path, name, cache_dir):
+    """Load a wallet CSV through a typed Parquet copy kept in cache_dir.
+
+    The Parquet file is reused while the CSV's mtime and size are unchanged.
+    If only the mtime moved, the content hash decides. Otherwise the CSV is
+    parsed again and the cache is rewritten.
+    """
+    path = Path(path)
+    cache_dir = Path(cache_dir)
+    parquet_path = cache_dir / f"{name}.parquet"
+    meta_path = cache_dir / f"{name}.meta.json"
+    stat = path.stat()
+
+    meta = None
+    if parquet_path.exists() and meta_path.exists():
+        try:
+            meta = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            meta = None
+
+    if meta and meta.get("schema_version") == CACHE_SCHEMA_VERSION and meta.get("size") == stat.st_size:
+        fresh = meta.get("mtime_ns") == stat.st_mtime_ns
+        if not fresh and _file_digest(path) == meta.get("sha256"):
+            fresh = True
+            meta["mtime_ns"] = stat.st_mtime_ns
+            meta_path.write_text(json.dumps(meta))
+        if fresh:
+            try:
+                # Arrow returns None for missing strings; normalise like the CSV path
+                return pd.read_parquet(parquet_path).fillna(np.nan)
+            except Exception as e:
+                print(f"Could not read columnar cache {parquet_path}: {e}")
+
+    df = _read_csv_table(path, name)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = parquet_path.with_suffix(".parquet.tmp")
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, parquet_path)
+        meta_path.write_text(json.dumps({
+            "source": str(path),
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": _file_digest(path),
+            "schema_version": CACHE_SCHEMA_VERSION,
+        }))
+        print(f"Columnar cache written for {name}: {parquet_path}")
+    except Exception as e:
+        print(f"Could not write columnar cache for {name}: {e}")
+    return df
+
+
+@metrics.timed("data_load")
+def load_wallet_data(data_dir="web3_kgenX_new", precompute_features=True, use_cache=False, cache_dir=None):
+    """Load and combine wallet data from CSV files.
+
+    Args:
+        data_dir: Directory containing the wallet CSV files
+        precompute_features: Build the bulk feature table for every local wallet
+        use_cache: Load through typed Parquet copies of the CSVs (see load_table_cached)
+        cache_dir: Where the Parquet copies live (defaults to <data_dir>/.cache)
+    """
     base_path = Path(data_dir)
+    cache_path = Path(cache_dir) if cache_dir else base_path / ".cache"
 
-    def safe_load(filename):
-        path = base_path / filename
+    def safe_load(name):
+        path = base_path / TABLE_FILES[name]
         if path.exists():
-            df = pd.read_csv(path)
-            return df.fillna(np.nan)
+            if use_cache:
+                return load_table_cached(path, name, cache_path)
+            return _read_csv_table(path, name)
         return pd.DataFrame()
 
-    data = {
-        "networth": safe_load("wallet_networth_all_chains.csv"),
-        "tokens": safe_load("token_balances.csv"),
-        "defi": safe_load("defi_positions.csv"),
-        "nfts": safe_load("nft_collections_cleaned.csv"),
-        "stats": safe_load("wallet_stats.csv")
-    }
-    
+    data = {name: safe_load(name) for name in TABLE_FILES}
+    data["sources"] = {name: _table_signature(base_path / TABLE_FILES[name]) for name in TABLE_FILES}
+    data["index"] = build_wallet_index(data)
+    data["networth_rollup"], data["chain_breakdown"] = build_networth_rollup(data["networth"])
+    if precompute_features:
+        data["features"] = extract_features_bulk(data)
+        data["segments"] = build_segment_index(data["features"], data["networth"])
+
     return data
 
+
+def _table_signature(path):
+    """(mtime_ns, size) of a table's CSV, or None when it does not exist."""
+    try:
+        stat = Path(path).stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def changed_tables(data_dict, data_dir="web3_kgenX_new"):
+    """Names of the tables whose CSV changed since data_dict was loaded."""
+    sources = data_dict.get("sources", {})
+    base_path = Path(data_dir)
+    return [
+        name for name, filename in TABLE_FILES.items()
+        if _table_signature(base_path / filename) != sources.get(name)
+    ]
+
+
+def _row_delta(old_df, new_df):
+    """Compare two versions of a table row by row.
+
+    Rows are matched by a hash of their values, so reordered rows do not
+    count as changes.
+
+    Returns:
+        (added, removed): boolean masks over the rows of new_df and old_df
+    """
+    if old_df.empty or new_df.empty or list(old_df.columns) != list(new_df.columns):
+        return np.ones(len(new_df), dtype=bool), np.ones(len(old_df), dtype=bool)
+    old_hashes = pd.util.hash_pandas_object(old_df, index=False).to_numpy()
+    new_hashes = pd.util.hash_pandas_object(new_df, index=False).to_numpy()
+    return ~np.isin(new_hashes, old_hashes), ~np.isin(old_hashes, new_hashes)
+
+
+@metrics.timed("data_reload")
+def reload_wallet_data(data_dict, data_dir="web3_kgenX_new", use_cache=False, cache_dir=None):
+    """Build a new data snapshot holding the current contents of the CSVs.
+
+    Only tables whose CSV changed are read again; the others are shared with
+    data_dict. Rows are diffed against the previous version of their table,
+    and features are recomputed for the wallets with added or removed rows
+    only, then merged into the previous feature table. data_dict itself is
+    not modified, so readers holding it keep a consistent view.
+
+    Args:
+        data_dict: Snapshot returned by load_wallet_data or a previous reload
+        data_dir: Directory containing the wallet CSV files
+        use_cache: Load through typed Parquet copies of the CSVs (see load_table_cached)
+        cache_dir: Where the Parquet copies live (defaults to <data_dir>/.cache)
+
+    Returns:
+        (data, summary): the new snapshot and the rows added and removed per
+        table, the number of changed wallets and the duration in seconds
+    """
+    started = time.perf_counter()
+    base_path = Path(data_dir)
+    cache_path = Path(cache_dir) if cache_dir else base_path / ".cache"
+
+    data = dict(data_dict)
+    data["sources"] = dict(data_dict.get("sources", {}))
+    summary = {"tables": {}, "wallets_changed": 0, "rows_changed": 0}
+    changed_wallets = set()
+
+    for name in changed_tables(data_dict, data_dir):
+        path = base_path / TABLE_FILES[name]
+        data["sources"][name] = _table_signature(path)
+        if not path.exists():
+            new_df = pd.DataFrame()
+        elif use_cache:
+            new_df = load_table_cached(path, name, cache_path)
+        else:
+            new_df = _read_csv_table(path, name)
+        old_df = data_dict.get(name, pd.DataFrame())
+        added, removed = _row_delta(old_df, new_df)
+        if not added.any() and not removed.any():
+            # Touched but not modified: keep the old frame and its index
+            continue
+        data[name] = new_df
+        for df, mask in ((new_df, added), (old_df, removed)):
+            if "wallet" in df.columns:
+                changed_wallets.update(df["wallet"].to_numpy(dtype=object)[mask])
+        summary["tables"][name] = {
+            "rows": len(new_df),
+            "rows_added": int(added.sum()),
+            "rows_removed": int(removed.sum())
+        }
+        summary["rows_changed"] += int(added.sum()) + int(removed.sum())
+
+    modified = set(summary["tables"])
+    if modified:
+        index = dict(data_dict.get("index", {}))
+        index.update(build_wallet_index(data, tables=modified))
+        data["index"] = index
+    if "networth" in modified:
+        data["networth_rollup"], data["chain_breakdown"] = build_networth_rollup(data["networth"])
+
+    changed_wallets = {wallet for wallet in changed_wallets if isinstance(wallet, str)}
+    if changed_wallets and data_dict.get("features") is not None:
+        data["features"] = _merge_features(data, data_dict["features"], changed_wallets)
+        data["segments"] = build_segment_index(data["features"], data["networth"])
+
+    summary["wallets_changed"] = len(changed_wallets)
+    summary["duration"] = round(time.perf_counter() - started, 3)
+    return data, summary
+
+
+def _merge_features(data, features, wallets):
+    """Recompute the bulk features of `wallets` and merge them into a feature table.
+
+    Features only depend on a wallet's own rows, so they are computed on the
+    slice of every table that belongs to the changed wallets.
+    """
+    remaining = [wallet for wallet in wallets if wallet in data["index"].get("networth", {})]
+    subset = {}
+    for name in WALLET_TABLES:
+        df = data.get(name, pd.DataFrame())
+        if df.empty or "wallet" not in df.columns:
+            subset[name] = df
+        else:
+            subset[name] = df[df["wallet"].isin(list(wallets))]
+    updated = extract_features_bulk(subset, wallets=remaining)
+    kept = features.drop(index=list(wallets), errors="ignore")
+    return pd.concat([kept, updated]) if len(updated) else kept
+
+
+# Tables that carry a "wallet" column and can be looked up per wallet
+WALLET_TABLES = ("networth", "tokens", "defi", "stats")
+
+
+def build_wallet_index(data_dict, tables=WALLET_TABLES):
+    """Group the row positions of every wallet-keyed table by wallet.
+
+    Returns a dict of table name -> {wallet_address: ndarray of row positions},
+    so a lookup only touches the rows belonging to that wallet.
+
+    Args:
+        tables: Only index these tables (other names are ignored)
+    """
+    index = {}
+    for name in WALLET_TABLES:
+        if name not in tables:
+            continue
+        df = data_dict.get(name, pd.DataFrame())
+        if df.empty or "wallet" not in df.columns:
+            index[name] = {}
+        else:
+            index[name] = df.groupby("wallet", sort=False, observed=True).indices
+    return index
+
+
+def wallet_in_data(wallet_address, data_dict):
+    """Check whether a wallet has net worth rows in the given data."""
+    index = data_dict.get("index")
+    if index is not None:
+        return wallet_address in index.get("networth", {})
+    networth_df = data_dict.get("networth", pd.DataFrame())
+    return False if networth_df.empty else wallet_address in networth_df["wallet"].values
+
+
+def wallet_rows(data_dict, table, wallet_address):
+    """Return the rows of `table` that belong to a wallet.
+
+    Uses the index built by load_wallet_data when present and falls back to a
+    full scan for ad-hoc dicts (e.g. data fetched from the API).
+    """
+    df = data_dict.get(table, pd.DataFrame())
+    if df.empty:
+        return df
+    index = data_dict.get("index")
+    if index is not None and table in index:
+        positions = index[table].get(wallet_address)
+        if positions is None:
+            return df.iloc[0:0]
+        return df.iloc[positions]
+    return df[df["wallet"] == wallet_address]
+
+
+# Per-chain values kept in the compact chain breakdown
+CHAIN_BREAKDOWN_COLUMNS = ("chain", "native_balance", "native_balance_usd", "token_balance_usd", "chain_networth_usd")
+
+
+def build_networth_rollup(networth_df):
+    """Roll the per-chain net worth rows up to one row per wallet.
+
+    The rollup holds the wallet's total net worth, its native and token USD
+    summed over all chains, the dominant chain (largest chain net worth, the
+    first listed on ties) with that chain's native balance, and the number
+    of chains with a positive net worth. The per-chain rows are kept in one
+    breakdown frame sorted by wallet and chain net worth; each rollup row
+    points at its slice with breakdown_start and breakdown_len.
+
+    Returns:
+        (rollup, breakdown): rollup is indexed by wallet, breakdown holds
+        CHAIN_BREAKDOWN_COLUMNS
+    """
+    df = networth_df[networth_df["wallet"].notna()] if not networth_df.empty else networth_df
+    if df.empty:
+        rollup = pd.DataFrame(
+            columns=["total_networth", "native_balance", "native_balance_usd", "token_balance_usd",
+                     "chain", "active_chains", "breakdown_start", "breakdown_len"],
+            index=pd.Index([], dtype=object, name="wallet")
+        )
+        return rollup, pd.DataFrame(columns=list(CHAIN_BREAKDOWN_COLUMNS))
+
+    codes, wallets = pd.factorize(df["wallet"].to_numpy(dtype=object))
+    chain_usd = _column(df, "chain_networth_usd").fillna(0).to_numpy(dtype=float)
+    positions = np.arange(len(df))
+    # Group by wallet (in order of appearance), largest chain first, listing order on ties
+    order = np.lexsort((positions, -chain_usd, codes))
+    starts = np.flatnonzero(np.r_[True, codes[order][1:] != codes[order][:-1]])
+    lengths = np.diff(np.r_[starts, len(order)])
+
+    chains = _column(df, "chain", "unknown").astype(object).to_numpy()[order]
+    chains = np.array([chain if isinstance(chain, str) and chain else "unknown" for chain in chains], dtype=object)
+    breakdown = pd.DataFrame({
+        "chain": chains,
+        "native_balance": _column(df, "native_balance").fillna(0).to_numpy(dtype=float)[order],
+        "native_balance_usd": _column(df, "native_balance_usd").fillna(0).to_numpy(dtype=float)[order],
+        "token_balance_usd": _column(df, "token_balance_usd").fillna(0).to_numpy(dtype=float)[order],
+        "chain_networth_usd": chain_usd[order],
+    })
+
+    # The wallet total is repeated on every row; take it from the first listed row
+    first_rows = np.minimum.reduceat(positions[order], starts)
+    total = _column(df, "total_networth_usd").to_numpy(dtype=float)[first_rows]
+    chain_sum = np.add.reduceat(breakdown["chain_networth_usd"].to_numpy(), starts)
+    rollup = pd.DataFrame({
+        "total_networth": np.where(np.isnan(total), chain_sum, total),
+        "native_balance": breakdown["native_balance"].to_numpy()[starts],
+        "native_balance_usd": np.add.reduceat(breakdown["native_balance_usd"].to_numpy(), starts),
+        "token_balance_usd": np.add.reduceat(breakdown["token_balance_usd"].to_numpy(), starts),
+        "chain": chains[starts],
+        "active_chains": np.add.reduceat((breakdown["chain_networth_usd"].to_numpy() > 0).astype(np.int64), starts),
+        "breakdown_start": starts,
+        "breakdown_len": lengths,
+    }, index=pd.Index(np.asarray(wallets, dtype=object), name="wallet"))
+    return rollup, breakdown
+
+
+def networth_rollup(data_dict):
+    """Return (rollup, breakdown) of a data dict, building it for dicts loaded without one."""
+    if data_dict.get("networth_rollup") is not None:
+        return data_dict["networth_rollup"], data_dict["chain_breakdown"]
+    return build_networth_rollup(data_dict.get("networth", pd.DataFrame()))
+
+
+def chain_breakdown(wallet_address, data_dict):
+    """Per-chain net worth of a wallet, largest chain first."""
+    rollup, breakdown = networth_rollup(data_dict)
+    if wallet_address not in rollup.index:
+        return []
+    start, length = rollup.loc[wallet_address, ["breakdown_start", "breakdown_len"]]
+    return breakdown.iloc[int(start):int(start) + int(length)].to_dict(orient="records")
+
+
+# Columns of the bulk feature table and the value used for wallets without data
+BULK_FEATURE_DEFAULTS = {
+    "total_networth": 0.0,
+    "native_balance": 0.0,
+    "native_balance_usd": 0.0,
+    "token_balance_usd": 0.0,
+    "chain": "unknown",
+    "active_chains": 0,
+    "token_ratio": 0.0,
+    "transactions_total": 0,
+    "nft_transfers_total": 0,
+    "token_transfers_total": 0,
+    "nft_count": 0,
+    "nft_collections": 0,
+    "token_count": 0,
+    "top_tokens": None,
+    "defi_protocols": 0,
+    "total_defi_usd": 0.0,
+    "unique_nft_collections": 0,
+    "activity_score": 0,
+    "wallet_health_score": 0.0,
+    "risk_score": 0.0,
+}
+
+
+def _column(df, name, default=0):
+    """Return a column of df, or a constant Series when it is missing."""
+    if name in df.columns:
+        return df[name]
+    return pd.Series(default, index=df.index)
+
+
+def _wallet_keyed(obj):
+    """Give a wallet-indexed result a plain object index (wallet may be categorical)."""
+    obj.index = pd.Index(np.asarray(obj.index, dtype=object), name="wallet")
+    return obj
+
+
+def extract_features_bulk(data_dict, wallets=None):
+    """Compute the table-derived features of many wallets in one pass.
+
+    Produces the same values as extract_wallet_features does for a single
+    local wallet, using groupby aggregations and NumPy arithmetic instead of
+    one lookup per wallet.
+
+    Args:
+        data_dict: Data as returned by load_wallet_data
+        wallets: Wallets to return (defaults to every wallet with net worth data)
+
+    Returns:
+        DataFrame indexed by wallet with one column per feature
+    """
+    networth_df = data_dict.get("networth", pd.DataFrame())
+    stats_df = data_dict.get("stats", pd.DataFrame())
+    token_df = data_dict.get("tokens", pd.DataFrame())
+    defi_df = data_dict.get("defi", pd.DataFrame())
+
+    if networth_df.empty:
+        universe = pd.Index([], name="wallet")
+    else:
+        universe = pd.Index(np.asarray(networth_df["wallet"].dropna().unique(), dtype=object), name="wallet")
+    if wallets is not None:
+        universe = pd.Index(list(dict.fromkeys(wallets)), dtype=object, name="wallet")
+
+    table = pd.DataFrame(index=universe)
+
+    # Net worth: the multi-chain rollup
+    if not networth_df.empty:
+        rollup, _ = networth_rollup(data_dict)
+        for feature in ("total_networth", "native_balance", "native_balance_usd", "token_balance_usd"):
+            table[feature] = rollup[feature].astype(float).reindex(universe, fill_value=0.0)
+        table["chain"] = rollup["chain"].reindex(universe, fill_value="unknown")
+        table["active_chains"] = rollup["active_chains"].astype(np.int64).reindex(universe, fill_value=0)
+        token_ratio = rollup["token_balance_usd"] / np.maximum(rollup["total_networth"], 1)
+        table["token_ratio"] = token_ratio.astype(float).reindex(universe, fill_value=0.0)
+
+    # Wallet stats
+    if not stats_df.empty:
+        first = _wallet_keyed(stats_df.drop_duplicates("wallet", keep="first").set_index("wallet"))
+        for feature, column in (
+            ("transactions_total", "transactions_total"),
+            ("nft_transfers_total", "nft_transfers_total"),
+            ("token_transfers_total", "token_transfers_total"),
+            ("nft_count", "nfts"),
+            ("nft_collections", "collections"),
+        ):
+            values = _column(first, column).fillna(0).astype(np.int64)
+            table[feature] = values.reindex(universe, fill_value=0)
+
+    # Token balances: distinct symbols and the three largest positions
+    if not token_df.empty:
+        by_wallet = token_df.groupby("wallet", sort=False, observed=True)
+        table["token_count"] = _wallet_keyed(by_wallet["token_symbol"].nunique()).reindex(universe, fill_value=0)
+        ranked = token_df.sort_values("usd_value", ascending=False, kind="stable")
+        top = (
+            ranked.groupby("wallet", sort=False, observed=True).head(3)
+            .groupby("wallet", sort=False, observed=True)["token_symbol"].agg(list)
+        )
+        table["top_tokens"] = _wallet_keyed(top).reindex(universe)
+
+    # DeFi positions
+    if not defi_df.empty:
+        protocols = defi_df.groupby("wallet", sort=False, observed=True)["protocol_name"].nunique()
+        table["defi_protocols"] = _wallet_keyed(protocols).reindex(universe, fill_value=0)
+        # Sum each wallet's contiguous slice with ndarray.sum, which is what
+        # Series.sum does; groupby().sum() and np.add.reduceat accumulate in a
+        # different order and can differ in the last bit
+        ordered = defi_df[defi_df["wallet"].notna()].sort_values("wallet", kind="stable")
+        if not ordered.empty:
+            wallet_ids = ordered["wallet"].to_numpy(dtype=object)
+            starts = np.flatnonzero(np.r_[True, wallet_ids[1:] != wallet_ids[:-1]])
+            values = ordered["usd_value"].fillna(0).to_numpy(dtype=float)
+            sums = [part.sum() for part in np.split(values, starts[1:])]
+            totals = pd.Series(sums, index=wallet_ids[starts], dtype=float)
+            table["total_defi_usd"] = totals.reindex(universe, fill_value=0.0)
+
+    for feature, default in BULK_FEATURE_DEFAULTS.items():
+        if feature not in table.columns:
+            table[feature] = default
+    table["top_tokens"] = [tokens if isinstance(tokens, list) else [] for tokens in table["top_tokens"]]
+    table["unique_nft_collections"] = table["nft_collections"]
+
+    # Derived scores
+    table["activity_score"] = (
+        table["transactions_total"] + table["nft_transfers_total"] + table["token_transfers_total"]
+    )
+    activity_norm = np.minimum(table["activity_score"].to_numpy() / 100, 1.0)
+    networth_norm = np.minimum(table["total_networth"].to_numpy(dtype=float) / 10_000, 1.0)
+    defi_norm = np.minimum(table["total_defi_usd"].to_numpy(dtype=float) / 5_000, 1.0)
+    wallet_health = (0.4 * activity_norm + 0.4 * networth_norm + 0.2 * defi_norm) * 100
+    risk_raw = (1 - networth_norm) * 0.5 + (1 - activity_norm) * 0.3 + (1 - defi_norm) * 0.2
+    # Python's round() rounds the exact binary value; np.round can differ by 0.1
+    table["wallet_health_score"] = [round(value, 1) for value in wallet_health.tolist()]
+    table["risk_score"] = [round(value, 1) for value in (risk_raw * 100).tolist()]
+
+    return table[list(BULK_FEATURE_DEFAULTS)]
+
+
+def feature_row(feature_table, wallet_address):
+    """Read one wallet's features from a bulk feature table as plain Python values."""
+    row = feature_table.loc[wallet_address]
+    features = {}
+    for name, value in row.items():
+        if isinstance(value, np.generic):
+            value = value.item()
+        elif isinstance(value, list):
+            value = list(value)
+        features[name] = value
+    return features
+
+
 def extract_wallet_features(wallet_address, data_dict):
-    """Extract features from wallet data, fetching from API if not found locally."""
+    """Extract features from wallet data, fetching from API if not found locally.
+
+    A dict returned by fetch_wallet_data_from_api is used as-is, even when the
+    wallet has no net worth rows, instead of being fetched a second time.
+    """
     features = {"address": wallet_address}
     
     # Check if wallet exists in local data
-    networth_df = data_dict.get("networth", pd.DataFrame())
-    wallet_exists = False if networth_df.empty else wallet_address in networth_df["wallet"].values
+    wallet_exists = data_dict.get("source") == "api" or wallet_in_data(wallet_address, data_dict)
     
     # If wallet not found in local data, try fetching from API
     if not wallet_exists:
         print(f"Wallet {wallet_address} not found in local data. Fetching from Moralis API...")
+        metrics.count("api_fallbacks_total")
         api_data = fetch_wallet_data_from_api(wallet_address)
         if api_data:
             data_dict = api_data
@@ -144,38 +866,114 @@ def extract_wallet_features(wallet_address, data_dict):
             print("Failed to fetch data from API")
             return None
 
-    if not networth_df.empty:
-        row = networth_df[networth_df["wallet"] == wallet_address]
-        if not row.empty:
-            row = row.iloc[0]
-            features.update({
-                "total_networth": float(row.get("total_networth_usd", 0) or 0),
-                "native_balance": float(row.get("native_balance", 0) or 0),
-                "token_balance_usd": float(row.get("token_balance_usd", 0) or 0),
-                "chain": row.get("chain", "unknown") or "unknown",
-                "token_ratio": float(row.get("token_balance_usd", 0) or 0) / max(float(row.get("total_networth_usd", 1) or 1), 1)
-            })
+    with metrics.span("index_lookup"):
+        feature_table = data_dict.get("features")
+        if feature_table is not None and wallet_address in feature_table.index:
+            features.update(feature_row(feature_table, wallet_address))
         else:
-            features.update({
-                "total_networth": 0,
-                "native_balance": 0,
-                "token_balance_usd": 0,
-                "chain": "unknown",
-                "token_ratio": 0
-            })
+            features.update(_extract_base_features(wallet_address, data_dict))
+        features["chain_breakdown"] = chain_breakdown(wallet_address, data_dict)
+
+    return _add_profile_features(features)
+
+
+def _add_profile_features(features, classifications=None):
+    """Add the classifications, social handle, recommendations and persona profile to base features.
+
+    The wallet is classified here once; callers read features["classifications"]
+    instead of calling classify_wallet again.
+
+    Args:
+        features: Base features of one wallet
+        classifications: Labels already computed by classify_many (computed here when None)
+    """
+    wallet_address = features["address"]
+
+    # Generate simple AI social handle (just a placeholder using wallet prefix + classification)
+    features["social_handle"] = generate_social_handle(wallet_address)
+
+    if classifications is None:
+        classifications = classify_wallet(features)
+    features["classifications"] = classifications
+    features["recommendations"] = generate_recommendations(features, classifications)
+    features["persona_profile"] = generate_persona_profile(features, classifications, features["recommendations"])
+
+    return features
+
+
+def extract_features_many(wallet_addresses, data_dict):
+    """Extract the features of many local wallets with one table lookup.
+
+    Uses the feature table precomputed by load_wallet_data (or computes one
+    for just these wallets) instead of one extract_wallet_features call per
+    wallet. Wallets without local data are left out; callers fall back to
+    extract_wallet_features, which fetches them from the API.
+
+    Args:
+        wallet_addresses: Wallets to extract
+        data_dict: Data as returned by load_wallet_data
+
+    Returns:
+        Dict mapping each local wallet to its features, in input order
+    """
+    local = [wallet for wallet in dict.fromkeys(wallet_addresses) if wallet_in_data(wallet, data_dict)]
+    if not local:
+        return {}
+
+    with metrics.span("batch_index_lookup"):
+        feature_table = data_dict.get("features")
+        if feature_table is None or any(wallet not in feature_table.index for wallet in local):
+            feature_table = extract_features_bulk(data_dict, local)
+        selected = feature_table.loc[local]
+        rows = selected.to_dict(orient="index")
+    labels = classify_many(selected)
+    return {
+        wallet: _add_profile_features({
+            "address": wallet,
+            **rows[wallet],
+            "chain_breakdown": chain_breakdown(wallet, data_dict)
+        }, labels[wallet])
+        for wallet in local
+    }
+
+
+def _extract_base_features(wallet_address, data_dict):
+    """Compute the table-derived features of a single wallet.
+
+    This is the per-wallet reference for extract_features_bulk; both must
+    produce the same values.
+    """
+    features = {}
+    networth_df = data_dict.get("networth", pd.DataFrame())
+    rows = wallet_rows(data_dict, "networth", wallet_address) if not networth_df.empty else networth_df
+    if not rows.empty:
+        # Roll up only this wallet's chains, exactly as the load-time rollup does
+        rollup, _ = build_networth_rollup(rows)
+        row = rollup.iloc[0]
+        features.update({
+            "total_networth": float(row["total_networth"]),
+            "native_balance": float(row["native_balance"]),
+            "native_balance_usd": float(row["native_balance_usd"]),
+            "token_balance_usd": float(row["token_balance_usd"]),
+            "chain": row["chain"],
+            "active_chains": int(row["active_chains"]),
+            "token_ratio": float(row["token_balance_usd"]) / max(float(row["total_networth"]), 1)
+        })
     else:
         features.update({
             "total_networth": 0,
             "native_balance": 0,
+            "native_balance_usd": 0,
             "token_balance_usd": 0,
             "chain": "unknown",
+            "active_chains": 0,
             "token_ratio": 0
         })
 
     # Wallet Stats
     stats_df = data_dict.get("stats", pd.DataFrame())
     if not stats_df.empty:
-        row = stats_df[stats_df["wallet"] == wallet_address]
+        row = wallet_rows(data_dict, "stats", wallet_address)
         if not row.empty:
             row = row.iloc[0]
             features.update({
@@ -205,10 +1003,10 @@ def extract_wallet_features(wallet_address, data_dict):
     # Token Balances
     token_df = data_dict.get("tokens", pd.DataFrame())
     if not token_df.empty:
-        user_tokens = token_df[token_df["wallet"] == wallet_address]
+        user_tokens = wallet_rows(data_dict, "tokens", wallet_address)
         features.update({
             "token_count": user_tokens["token_symbol"].nunique(),
-            "top_tokens": user_tokens.sort_values("usd_value", ascending=False)
+            "top_tokens": user_tokens.sort_values("usd_value", ascending=False, kind="stable")
                                         .head(3)["token_symbol"].tolist()
         })
     else:
@@ -220,7 +1018,7 @@ def extract_wallet_features(wallet_address, data_dict):
     # DeFi Positions
     defi_df = data_dict.get("defi", pd.DataFrame())
     if not defi_df.empty:
-        user_defi = defi_df[defi_df["wallet"] == wallet_address]
+        user_defi = wallet_rows(data_dict, "defi", wallet_address)
         features.update({
             "defi_protocols": user_defi["protocol_name"].nunique() if not user_defi.empty else 0,
             "total_defi_usd": user_defi["usd_value"].sum() if not user_defi.empty else 0.0
@@ -253,59 +1051,259 @@ def extract_wallet_features(wallet_address, data_dict):
     risk_raw = (1 - networth_norm) * 0.5 + (1 - activity_norm) * 0.3 + (1 - defi_norm) * 0.2
     features["risk_score"] = round(risk_raw * 100, 1)  # Higher means riskier
 
-    # Generate simple AI social handle (just a placeholder using wallet prefix + classification)
-    features["social_handle"] = generate_social_handle(wallet_address)
+    return features
 
-    # Generate dApp/NFT recommendations based on wallet profile (simplified)
-    # We will assign classifications later, so skip referencing them here
-    
 
-    classifications = classify_wallet(features)
-    features["recommendations"] = generate_recommendations(features, classifications)
-    features["persona_profile"] = generate_persona_profile(features, classifications)
+# Persona labels as (label, feature, threshold, group). A wallet gets a label
+# when the feature is above the threshold; of the labels sharing a group only
+# the first match is kept. Wallets without any label are DEFAULT_CLASSIFICATION.
+CLASSIFICATION_RULES = (
+    ("whale", "total_networth", 1_000_000, "networth"),
+    ("large_holder", "total_networth", 100_000, "networth"),
+    ("token_diversified", "token_ratio", 0.7, None),
+    ("token_explorer", "token_count", 25, None),
+    ("nft_whale", "unique_nft_collections", 20, "nft"),
+    ("nft_collector", "nft_count", 10, "nft"),
+    ("nft_trader", "nft_transfers_total", 200, None),
+    ("defi_power_user", "defi_protocols", 5, None),
+    ("defi_whale", "total_defi_usd", 100_000, None),
+    ("power_user", "transactions_total", 100_000, None),
+    ("high_volume_trader", "token_transfers_total", 100_000, None),
+)
+DEFAULT_CLASSIFICATION = "retail_user"
 
-    return features
+# Recommendations as (text, condition). A condition is (feature, ">" or "<",
+# threshold, value of a missing feature), or ("label", name) for wallets
+# classified as name. Wallets matching none get DEFAULT_RECOMMENDATION.
+RECOMMENDATION_RULES = (
+    ("Explore DeFi yield farming protocols", ("wallet_health_score", ">", 70, 0)),
+    ("Consider long-term staking opportunities", ("risk_score", "<", 50, 100)),
+    ("Check out exclusive NFT drops on OpenSea", ("label", "nft_whale")),
+    ("Diversify portfolio with Layer 2 tokens", ("token_count", ">", 20, 0)),
+)
+DEFAULT_RECOMMENDATION = "Start exploring popular dApps like Uniswap and Aave"
+
+_COMPARISONS = {">": operator.gt, "<": operator.lt}
+
+
+def _feature_values(feature_table, feature, default):
+    """A feature column as a float array, or default everywhere when it is missing."""
+    if feature in feature_table.columns:
+        return feature_table[feature].to_numpy(dtype=float)
+    return np.full(len(feature_table), default, dtype=float)
 
 
+@metrics.timed("classify")
 def classify_wallet(features):
     """Assign persona categories based on extracted features."""
     classification = []
-
-    networth = features.get("total_networth", 0)
-    if networth > 1_000_000:
-        classification.append("whale")
-    elif networth > 100_000:
-        classification.append("large_holder")
-
-    if features.get("token_ratio", 0) > 0.7:
-        classification.append("token_diversified")
-    if features.get("token_count", 0) > 25:
-        classification.append("token_explorer")
-
-    if features.get("unique_nft_collections", 0) > 20:
-        classification.append("nft_whale")
-    elif features.get("nft_count", 0) > 10:
-        classification.append("nft_collector")
-
-    if features.get("nft_transfers_total", 0) > 200:
-        classification.append("nft_trader")
-
-    if features.get("defi_protocols", 0) > 5:
-        classification.append("defi_power_user")
-    if features.get("total_defi_usd", 0) > 100_000:
-        classification.append("defi_whale")
-
-    if features.get("transactions_total", 0) > 100_000:
-        classification.append("power_user")
-    if features.get("token_transfers_total", 0) > 100_000:
-        classification.append("high_volume_trader")
+    matched_groups = set()
+    for label, feature, threshold, group in CLASSIFICATION_RULES:
+        if group is not None and group in matched_groups:
+            continue
+        if features.get(feature, 0) > threshold:
+            classification.append(label)
+            matched_groups.add(group)
 
     if not classification:
-        classification.append("retail_user")
+        classification.append(DEFAULT_CLASSIFICATION)
 
     return classification
 
 
+def classification_masks(feature_table):
+    """Evaluate CLASSIFICATION_RULES over a whole feature table at once.
+
+    Args:
+        feature_table: DataFrame indexed by wallet, as from extract_features_bulk
+
+    Returns:
+        Boolean DataFrame with one column per label (and DEFAULT_CLASSIFICATION),
+        True where the wallet has the label; it agrees with classify_wallet
+    """
+    masks = {}
+    matched_groups = {}
+    for label, feature, threshold, group in CLASSIFICATION_RULES:
+        mask = _feature_values(feature_table, feature, 0) > threshold
+        if group is not None:
+            taken = matched_groups.get(group)
+            if taken is not None:
+                mask &= ~taken
+                taken |= mask
+            else:
+                matched_groups[group] = mask.copy()
+        masks[label] = mask
+    masks[DEFAULT_CLASSIFICATION] = ~np.logical_or.reduce(list(masks.values()), initial=False)
+    return pd.DataFrame(masks, index=feature_table.index)
+
+
+def _mask_lists(masks):
+    """Turn a boolean DataFrame into one list of the True column names per row, in column order."""
+    values = masks.to_numpy()
+    names = list(masks.columns)
+    lists = [[] for _ in range(len(values))]
+    for column, name in enumerate(names):
+        for row in np.flatnonzero(values[:, column]).tolist():
+            lists[row].append(name)
+    return lists
+
+
+def classify_many(feature_table):
+    """classify_wallet for every wallet of a feature table, as a Series of label lists."""
+    with metrics.span("classify_many"):
+        return pd.Series(_mask_lists(classification_masks(feature_table)), index=feature_table.index, dtype=object)
+
+
+def recommendation_masks(feature_table, labels=None):
+    """Evaluate RECOMMENDATION_RULES over a whole feature table at once.
+
+    Args:
+        feature_table: DataFrame indexed by wallet, as from extract_features_bulk
+        labels: classification_masks of the table (computed when None)
+
+    Returns:
+        Boolean DataFrame with one column per recommendation text
+    """
+    if labels is None:
+        labels = classification_masks(feature_table)
+    masks = {}
+    for text, condition in RECOMMENDATION_RULES:
+        if condition[0] == "label":
+            masks[text] = labels[condition[1]].to_numpy()
+        else:
+            feature, comparison, threshold, default = condition
+            masks[text] = _COMPARISONS[comparison](_feature_values(feature_table, feature, default), threshold)
+    masks[DEFAULT_RECOMMENDATION] = ~np.logical_or.reduce(list(masks.values()), initial=False)
+    return pd.DataFrame(masks, index=feature_table.index)
+
+
+# Numeric features a cohort query can filter on with a range
+COHORT_RANGE_FEATURES = ("wallet_health_score", "risk_score", "total_networth", "token_count", "defi_protocols")
+
+
+def build_segment_index(feature_table, networth_df=None):
+    """Index a feature table for cohort queries.
+
+    Every wallet is identified by its position in the feature table. Labels
+    and chains get a boolean mask over the positions plus the sorted
+    positions where it is set; every range feature gets its values sorted,
+    with the position of each value, so a range is two binary searches.
+
+    Args:
+        feature_table: DataFrame indexed by wallet, as from extract_features_bulk
+        networth_df: Net worth rows; a wallet is indexed under every chain with a
+            positive chain_networth_usd
+
+    Returns:
+        Dict with "wallets", "labels", "chains", "values" and "ranges"
+    """
+    def segment(mask):
+        return {"mask": mask, "positions": np.flatnonzero(mask)}
+
+    wallets = feature_table.index.to_numpy(dtype=object)
+    labels = classification_masks(feature_table)
+
+    chains = {}
+    if networth_df is not None and not networth_df.empty:
+        # Chains with a positive net worth, as counted by active_chains
+        positive = _column(networth_df, "chain_networth_usd").fillna(0).to_numpy(dtype=float) > 0
+        held = networth_df.loc[positive, ["wallet", "chain"]].dropna().drop_duplicates()
+        positions = feature_table.index.get_indexer(held["wallet"])
+        held = held.assign(position=positions)[positions >= 0]
+        for chain, group in held.groupby("chain", sort=False, observed=True):
+            mask = np.zeros(len(wallets), dtype=bool)
+            mask[group["position"].to_numpy()] = True
+            chains[str(chain).lower()] = segment(mask)
+
+    values = {}
+    ranges = {}
+    for feature in COHORT_RANGE_FEATURES:
+        column = _feature_values(feature_table, feature, 0)
+        # NaN sorts last and is never inside a range
+        order = np.argsort(column, kind="stable")
+        values[feature] = column
+        ranges[feature] = (column[order], order)
+
+    return {
+        "wallets": wallets,
+        "labels": {label: segment(labels[label].to_numpy()) for label in labels.columns},
+        "chains": chains,
+        "values": values,
+        "ranges": ranges,
+    }
+
+
+@metrics.timed("cohort_query")
+def query_cohort(segments, labels=(), chain=None, ranges=None, offset=0, limit=100):
+    """Find the wallets matching every filter of a cohort query.
+
+    The smallest candidate set (a label's or chain's positions, or one
+    range's slice of the sorted values) is narrowed with the other filters,
+    so a query touches only the wallets of its most selective filter.
+
+    Args:
+        segments: Index from build_segment_index
+        labels: Classification labels a wallet must all have
+        chain: Chain a wallet must have a positive net worth on
+        ranges: Dict of feature -> (minimum, maximum), inclusive; either may be None
+        offset: Matches to skip, in feature table order
+        limit: Positions to return (None for all, 0 for just the count)
+
+    Returns:
+        (total number of matches, positions of the requested page)
+
+    Raises:
+        KeyError: For an unknown label or range feature
+    """
+    sets = [segments["labels"][label] for label in labels]
+    if chain is not None:
+        # A chain nobody holds matches no wallet
+        empty = {"mask": np.zeros(len(segments["wallets"]), dtype=bool), "positions": np.array([], dtype=np.intp)}
+        sets.append(segments["chains"].get(chain.lower(), empty))
+    candidates = [(len(segment["positions"]), "set", segment) for segment in sets]
+
+    bounds = {}
+    for feature, (low, high) in (ranges or {}).items():
+        sorted_values, order = segments["ranges"][feature]
+        start = 0 if low is None else np.searchsorted(sorted_values, low, side="left")
+        # NaN sorts after every number, so an open upper end stops before it
+        stop = np.searchsorted(sorted_values, np.inf if high is None else high, side="right")
+        bounds[feature] = (low, high)
+        candidates.append((max(stop - start, 0), "range", (feature, order[start:stop])))
+
+    if not candidates:
+        positions = np.arange(len(segments["wallets"]))
+    else:
+        _, kind, source = min(candidates, key=lambda candidate: candidate[0])
+        positions = source["positions"] if kind == "set" else np.sort(source[1])
+        for segment in sets:
+            if segment is not source:
+                positions = positions[segment["mask"][positions]]
+        for feature, (low, high) in bounds.items():
+            if kind == "range" and feature == source[0]:
+                continue
+            selected = segments["values"][feature][positions]
+            keep = ~np.isnan(selected)
+            if low is not None:
+                keep &= selected >= low
+            if high is not None:
+                keep &= selected <= high
+            positions = positions[keep]
+
+    total = len(positions)
+    end = None if limit is None else offset + limit
+    return total, positions[offset:end]
+
+
+def segment_labels(segments, positions):
+    """The classification labels of the wallets at positions, in rule order."""
+    return [
+        [label for label, segment in segments["labels"].items() if segment["mask"][position]]
+        for position in positions.tolist()
+    ]
+
+
+
 # Helper functions for added features:
 
 def generate_social_handle(wallet_address):
@@ -319,21 +1317,27 @@ def generate_social_handle(wallet_address):
 def generate_recommendations(features, classifications):
     """Return a list of dApps/NFT or strategies to recommend based on features."""
     recs = []
-    if features.get("wallet_health_score", 0) > 70:
-        recs.append("Explore DeFi yield farming protocols")
-    if features.get("risk_score", 100) < 50:
-        recs.append("Consider long-term staking opportunities")
-    if "nft_whale" in classifications:
-        recs.append("Check out exclusive NFT drops on OpenSea")
-    if features.get("token_count", 0) > 20:
-        recs.append("Diversify portfolio with Layer 2 tokens")
+    for text, condition in RECOMMENDATION_RULES:
+        if condition[0] == "label":
+            matched = condition[1] in classifications
+        else:
+            feature, comparison, threshold, default = condition
+            matched = _COMPARISONS[comparison](features.get(feature, default), threshold)
+        if matched:
+            recs.append(text)
     if not recs:
-        recs.append("Start exploring popular dApps like Uniswap and Aave")
+        recs.append(DEFAULT_RECOMMENDATION)
     return recs
 
 
-def generate_persona_profile(features, classifications):
-    """Generate a detailed persona profile text based on features and classifications."""
+def generate_persona_profile(features, classifications, recommendations=None):
+    """Generate a detailed persona profile text based on features and classifications.
+
+    Args:
+        features: Extracted features of the wallet
+        classifications: Labels from classify_wallet
+        recommendations: Output of generate_recommendations (computed when None)
+    """
 
     handle = features.get("social_handle", "CryptoUser")
     networth = features.get("total_networth", 0)
@@ -384,7 +1388,7 @@ def generate_persona_profile(features, classifications):
     blockchain_pref = f"Primarily active on the {chain} blockchain, leveraging its ecosystem for opportunities."
 
     # Recommendations (build dynamically from generate_recommendations)
-    recs = generate_recommendations(features, classifications)
+    recs = recommendations if recommendations is not None else generate_recommendations(features, classifications)
     recs_text = "\n".join([f"- {r}" for r in recs])
 
     # Compose markdown persona profile
@@ -0,0 +1,433 @@
+import atexit
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import metrics
+
+
+class InferenceTimeout(TimeoutError):
+    """An inference job did not finish within its timeout and was cancelled."""
+
+
+class WorkerCrashed(RuntimeError):
+    """The worker process running an inference job exited before finishing it."""
+
+
+class InferenceJob:
+    """Handle of one job submitted to an InferencePool."""
+
+    def __init__(self, job_id, worker):
+        self.id = job_id
+        self.worker = worker
+        self.future = Future()
+        # Streamed text chunks; None marks the end of the stream
+        self.chunks = queue.Queue()
+
+    def finish(self, result=None, error=None):
+        if self.future.done():
+            return
+        if error is not None:
+            self.future.set_exception(error)
+        else:
+            self.future.set_result(result)
+        self.chunks.put(None)
+
+
+def _worker_main(config, warm_up, requests, results):
+    """Entry point of an inference worker process.
+
+    Loads its own WalletPersonaGenerator and runs every job on a thread pool,
+    so concurrent jobs still reach the generator's micro-batcher together.
+    """
+    try:
+        from test import WalletPersonaGenerator
+        generator = WalletPersonaGenerator(**config)
+        if warm_up:
+            generator.warm_up()
+    except Exception as e:
+        results.put(("failed", None, f"{type(e).__name__}: {e}"))
+        return
+    results.put(("ready", None, os.getpid()))
+
+    cancel_events = {}
+    lock = threading.Lock()
+    executor = ThreadPoolExecutor(
+        max_workers=max(config.get("max_batch_size", 8), 1) * 2,
+        thread_name_prefix="inference-job"
+    )
+
+    def run(job_id, method, kwargs, cancelled):
+        try:
+            if cancelled.is_set():
+                return
+            if method == "stream":
+                for text in generator.stream_persona(stop_event=cancelled, **kwargs):
+                    results.put(("chunk", job_id, text))
+                results.put(("done", job_id, None))
+            elif method == "generate":
+                results.put(("result", job_id, generator.generate_persona(stop_event=cancelled, **kwargs)))
+            elif method == "warm_up":
+                results.put(("result", job_id, generator.warm_up()))
+            elif method == "stats":
+                results.put(("result", job_id, generator.persona_cache_stats()))
+            elif method == "metrics":
+                results.put(("result", job_id, metrics.registry.snapshot()))
+            else:
+                raise ValueError(f"Unknown inference method {method!r}")
+        except Exception as e:
+            results.put(("error", job_id, f"{type(e).__name__}: {e}"))
+        finally:
+            with lock:
+                cancel_events.pop(job_id, None)
+
+    parent = multiprocessing.parent_process()
+    while True:
+        try:
+            message = requests.get(timeout=1.0)
+        except queue.Empty:
+            # Exit with the API process instead of lingering as an orphan
+            if parent is not None and not parent.is_alive():
+                break
+            continue
+        if message is None:
+            break
+
+        kind, job_id, method, kwargs = message
+        if kind == "cancel":
+            with lock:
+                event = cancel_events.get(job_id)
+            if event is not None:
+                event.set()
+            continue
+
+        event = threading.Event()
+        with lock:
+            cancel_events[job_id] = event
+        executor.submit(run, job_id, method, kwargs, event)
+
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _Worker:
+    """Parent-side state of one worker process."""
+
+    def __init__(self, slot, process, requests, results):
+        self.slot = slot
+        self.process = process
+        self.requests = requests
+        self.results = results
+        self.jobs = {}
+        self.ready = threading.Event()
+        self.error = None
+        self.pid = None
+        self.started = time.time()
+
+
+class InferencePool:
+    """Persona generation in dedicated worker processes.
+
+    Each worker process loads its own copy of the model. The API process only
+    exchanges jobs and results with the workers over multiprocessing queues,
+    so request threads never hold the GIL for inference and a crashing worker
+    only fails its own in-flight jobs. A crashed worker is respawned.
+
+    The pool exposes the same generate_persona/stream_persona/warm_up/
+    persona_cache_stats methods as WalletPersonaGenerator.
+    """
+
+    def __init__(self, config, workers=1, timeout=300, start_timeout=None):
+        """
+        Args:
+            config: Keyword arguments for WalletPersonaGenerator in every worker
+            workers: Number of worker processes (each holds a model copy)
+            timeout: Default seconds a job may take before it is cancelled
+            start_timeout: Seconds to wait for the workers to load the model (None waits forever)
+        """
+        self.config = config
+        self.size = workers
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.restarts = 0
+        self.warmed_up = False
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = {}
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._closed = False
+
+    def start(self):
+        """Spawn the workers and wait until they have loaded the model"""
+        for slot in range(self.size):
+            self._spawn(slot)
+        atexit.register(self.close)
+
+        deadline = time.monotonic() + self.start_timeout if self.start_timeout else None
+        for worker in list(self._workers.values()):
+            remaining = deadline - time.monotonic() if deadline else None
+            if not worker.ready.wait(remaining):
+                self.close()
+                raise InferenceTimeout(f"Inference worker {worker.slot} did not start in time")
+            if worker.error:
+                self.close()
+                raise RuntimeError(f"Inference worker {worker.slot} failed to load the model: {worker.error}")
+        print(f"{self.size} inference worker(s) ready")
+        return self
+
+    def _spawn(self, slot):
+        requests = self._context.Queue()
+        results = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self.config, self.warmed_up, requests, results),
+            name=f"inference-worker-{slot}",
+            daemon=True
+        )
+        process.start()
+        worker = _Worker(slot, process, requests, results)
+        with self._lock:
+            self._workers[slot] = worker
+        threading.Thread(
+            target=self._collect, args=(worker,), name=f"inference-results-{slot}", daemon=True
+        ).start()
+        return worker
+
+    def _collect(self, worker):
+        """Route a worker's messages to its jobs until the worker exits"""
+        while True:
+            try:
+                kind, job_id, payload = worker.results.get(timeout=0.5)
+            except queue.Empty:
+                if worker.process.is_alive():
+                    continue
+                self._on_exit(worker)
+                return
+
+            if kind == "ready":
+                worker.pid = payload
+                self._set_ready(worker)
+                continue
+            if kind == "failed":
+                worker.error = payload
+                print(f"Inference worker {worker.slot} failed to start: {payload}")
+                self._set_ready(worker)
+                continue
+
+            with self._lock:
+                job = worker.jobs.get(job_id)
+                if job is not None and kind != "chunk":
+                    del worker.jobs[job_id]
+            if job is None:
+                # Cancelled or timed out on the API side already
+                continue
+            if kind == "chunk":
+                job.chunks.put(payload)
+            elif kind == "done":
+                job.finish()
+            elif kind == "result":
+                job.finish(result=payload)
+            elif kind == "error":
+                job.finish(error=RuntimeError(payload))
+
+    def _set_ready(self, worker):
+        with self._changed:
+            worker.ready.set()
+            self._changed.notify_all()
+
+    def _on_exit(self, worker):
+        """Fail the jobs of an exited worker and respawn it"""
+        with self._changed:
+            jobs = list(worker.jobs.values())
+            worker.jobs.clear()
+            was_ready = worker.ready.is_set() and not worker.error
+            if not worker.ready.is_set():
+                worker.error = f"exited with code {worker.process.exitcode} while loading"
+                worker.ready.set()
+            self._changed.notify_all()
+
+        for job in jobs:
+            job.finish(error=WorkerCrashed(
+                f"Inference worker {worker.slot} exited with code {worker.process.exitcode}"
+            ))
+        if self._closed:
+            return
+
+        print(f"Inference worker {worker.slot} (pid {worker.pid}) exited with code "
+              f"{worker.process.exitcode}, {len(jobs)} job(s) failed")
+        # A worker that never finished loading would most likely fail again
+        if was_ready:
+            self.restarts += 1
+            self._spawn(worker.slot)
+
+    def _pick_worker(self, timeout):
+        """Return the ready worker with the fewest jobs, waiting for one if none is ready"""
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._changed:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Inference pool is closed")
+                ready = [
+                    worker for worker in self._workers.values()
+                    if worker.ready.is_set() and not worker.error and worker.process.is_alive()
+                ]
+                if ready:
+                    return min(ready, key=lambda worker: len(worker.jobs))
+                if not any(not worker.ready.is_set() for worker in self._workers.values()):
+                    raise RuntimeError("No inference worker is available")
+                remaining = deadline - time.monotonic() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    raise InferenceTimeout("Timed out waiting for an inference worker")
+                self._changed.wait(remaining)
+
+    def submit(self, method, worker=None, timeout=None, **kwargs):
+        """Queue a job on a worker and return its InferenceJob"""
+        worker = worker or self._pick_worker(timeout or self.timeout)
+        job = InferenceJob(next(self._job_ids), worker)
+        with self._lock:
+            worker.jobs[job.id] = job
+        worker.requests.put(("job", job.id, method, kwargs))
+        return job
+
+    def cancel(self, job, error=None):
+        """Cancel a job: drop it here and stop it in the worker if it is still running
+
+        The worker sets the job's stop event, which ends a stream or takes a
+        generate job's sequence out of its batch (or drops it before its
+        batch starts), so timed-out jobs do not keep the model busy.
+        """
+        with self._lock:
+            job.worker.jobs.pop(job.id, None)
+        if job.worker.process.is_alive():
+            job.worker.requests.put(("cancel", job.id, None, None))
+        job.finish(error=error or InferenceTimeout(f"Inference job {job.id} was cancelled"))
+
+    def _wait(self, job, timeout):
+        try:
+            return job.future.result(timeout)
+        except FutureTimeoutError:
+            self.cancel(job)
+            raise InferenceTimeout(f"Inference job {job.id} did not finish within {timeout}s")
+
+    def generate_persona(self, wallet_data, detailed=True, use_cache=True, timeout=None):
+        """Generate a persona in a worker process, waiting up to timeout seconds"""
+        timeout = timeout or self.timeout
+        job = self.submit("generate", timeout=timeout,
+                          wallet_data=wallet_data, detailed=detailed, use_cache=use_cache)
+        return self._wait(job, timeout)
+
+    def stream_persona(self, wallet_data, detailed=True, use_cache=True, timeout=None):
+        """Stream a persona from a worker process.
+
+        The job is cancelled when the caller stops iterating (e.g. the client
+        disconnected) or when the whole stream takes longer than timeout.
+        """
+        timeout = timeout or self.timeout
+        job = self.submit("stream", timeout=timeout,
+                          wallet_data=wallet_data, detailed=detailed, use_cache=use_cache)
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                try:
+                    text = job.chunks.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    self.cancel(job)
+                    raise InferenceTimeout(f"Inference job {job.id} did not finish within {timeout}s")
+                if text is None:
+                    # Raises the job's error, if any
+                    job.future.result()
+                    return
+                yield text
+        finally:
+            if not job.future.done():
+                self.cancel(job)
+
+    def warm_up(self):
+        """Run a warm-up generation in every worker; respawned workers warm up on start"""
+        self.warmed_up = True
+        with self._lock:
+            workers = [worker for worker in self._workers.values() if worker.ready.is_set() and not worker.error]
+        jobs = [self.submit("warm_up", worker=worker) for worker in workers]
+        return max((self._wait(job, self.timeout) for job in jobs), default=0.0)
+
+    def _ask_workers(self, method, timeout=10):
+        """Run a quick job on every ready worker; returns (answers, workers asked)
+
+        A worker busy generating may not answer in time. Its job is cancelled
+        and its answer left out instead of failing the whole call.
+        """
+        with self._lock:
+            workers = [worker for worker in self._workers.values() if worker.ready.is_set() and not worker.error]
+        jobs = [self.submit(method, worker=worker) for worker in workers]
+        deadline = time.monotonic() + timeout
+        answers = []
+        for job in jobs:
+            try:
+                answers.append(self._wait(job, max(deadline - time.monotonic(), 0.01)))
+            except Exception as e:
+                print(f"Inference worker {job.worker.slot} did not answer {method!r}: {e}")
+        return answers, len(workers)
+
+    def persona_cache_stats(self):
+        """Persona cache counters summed over the workers that answered within 10s"""
+        stats, asked = self._ask_workers("stats")
+        stats = [entry for entry in stats if entry]
+        if not stats:
+            return None
+        merged = {key: sum(entry[key] for entry in stats)
+                  for key in ("hits", "misses", "disk_hits", "size", "maxsize")}
+        lookups = merged["hits"] + merged["misses"]
+        merged["hit_rate"] = round(merged["hits"] / lookups, 4) if lookups else 0.0
+        merged["ttl"] = stats[0]["ttl"]
+        merged["persistent"] = stats[0]["persistent"]
+        merged["workers"] = len(stats)
+        merged["workers_unanswered"] = asked - len(stats)
+        return merged
+
+    def metrics_snapshots(self):
+        """Metric samples recorded by each worker that answered within 10s (see metrics.Registry.snapshot)"""
+        return self._ask_workers("metrics")[0]
+
+    def stats(self):
+        """State of every worker process"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "restarts": self.restarts,
+                "workers": [
+                    {
+                        "slot": worker.slot,
+                        "pid": worker.pid,
+                        "alive": worker.process.is_alive(),
+                        "ready": worker.ready.is_set() and not worker.error,
+                        "error": worker.error,
+                        "in_flight": len(worker.jobs),
+                        "uptime": round(time.time() - worker.started, 1)
+                    }
+                    for worker in self._workers.values()
+                ]
+            }
+
+    def close(self):
+        """Stop the workers"""
+        if self._closed:
+            return
+        self._closed = True
+        with self._changed:
+            workers = list(self._workers.values())
+            self._changed.notify_all()
+        for worker in workers:
+            if worker.process.is_alive():
+                worker.requests.put(None)
+        for worker in workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            for job in list(worker.jobs.values()):
+                job.finish(error=WorkerCrashed("Inference pool was closed"))
+            worker.jobs.clear()
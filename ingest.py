@@ -0,0 +1,316 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from threading import Lock
+
+import pandas as pd
+import requests
+
+from dataLoading import (
+    TABLE_FILES,
+    load_table_cached,
+    fetch_networth_rows,
+    fetch_token_rows,
+    fetch_stats_rows,
+    fetch_nft_rows,
+    fetch_defi_rows,
+    fetch_active_chain_rows
+)
+
+# Output file, wallet key column and fetcher of every dataset the ingestion can refresh.
+# Fetchers bypass moralis_cache, so a refresh always gets current data from Moralis
+DATASETS = {
+    "networth": (TABLE_FILES["networth"], "wallet",
+                 lambda wallet, args: fetch_networth_rows(wallet, use_cache=False)),
+    "tokens": (TABLE_FILES["tokens"], "wallet",
+               lambda wallet, args: fetch_token_rows(wallet, args.chain, use_cache=False)),
+    "stats": (TABLE_FILES["stats"], "wallet",
+              lambda wallet, args: fetch_stats_rows(wallet, args.chain, use_cache=False)),
+    "nfts": (TABLE_FILES["nfts"], "wallet_address",
+             lambda wallet, args: fetch_nft_rows(wallet, args.chain, use_cache=False)),
+    "defi": (TABLE_FILES["defi"], "wallet",
+             lambda wallet, args: fetch_defi_rows(wallet, args.protocol, args.chain, use_cache=False)),
+    "active_chains": ("wallet_active_chains.csv", "wallet",
+                      lambda wallet, args: fetch_active_chain_rows(wallet, use_cache=False)),
+}
+
+# HTTP status codes worth retrying (rate limited or transient server errors)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by all ingestion workers."""
+
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate: Tokens added per second (sustained requests per second)
+            capacity: Maximum burst size (defaults to one second of tokens)
+        """
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = Lock()
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` tokens are available, then take them."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait_time = (tokens - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class ShardWriter:
+    """Append-only JSON-lines shard holding one record per finished wallet.
+
+    A record is written only after all rows of a wallet were fetched, so the
+    shards double as the checkpoint: a wallet with a record is done.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._lock = Lock()
+
+    def write(self, wallet, rows):
+        line = json.dumps({"wallet": wallet, "rows": rows}, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def read_shards(shard_dir):
+    """Yield the (wallet, rows) records of every shard in a dataset directory.
+
+    A truncated last line (from a crash mid-write) is skipped.
+    """
+    for path in sorted(Path(shard_dir).glob("*.jsonl")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                yield record["wallet"], record["rows"]
+
+
+def completed_wallets(work_dir, dataset):
+    """Return the wallets that already have a record for a dataset."""
+    return {wallet for wallet, _ in read_shards(Path(work_dir) / "shards" / dataset)}
+
+
+def discard_merged(work_dir, datasets):
+    """Delete the shards and logged errors of datasets whose run was merged.
+
+    Once merged, a run is finished; the next run fetches every wallet again
+    instead of treating the merged wallets as done.
+    """
+    work_dir = Path(work_dir)
+    for dataset in datasets:
+        shutil.rmtree(work_dir / "shards" / dataset, ignore_errors=True)
+
+    errors_path = work_dir / "errors.jsonl"
+    if not errors_path.exists():
+        return
+    with open(errors_path, encoding="utf-8") as f:
+        kept = [line for line in f if line.strip() and json.loads(line).get("dataset") not in datasets]
+    if kept:
+        errors_path.write_text("".join(kept), encoding="utf-8")
+    else:
+        errors_path.unlink()
+
+
+def load_wallet_list(path, column="wallet_ID"):
+    """Read the wallet addresses to ingest, dropping blanks and duplicates."""
+    df = pd.read_csv(path)
+    return list(dict.fromkeys(df[column].dropna().astype(str)))
+
+
+def fetch_with_retry(fetch, wallet, args, bucket):
+    """Run one fetch under the rate limiter, retrying transient HTTP errors."""
+    for attempt in range(args.retries + 1):
+        bucket.acquire()
+        try:
+            return fetch(wallet, args)
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status not in RETRY_STATUS or attempt == args.retries:
+                raise
+        except requests.RequestException:
+            if attempt == args.retries:
+                raise
+        time.sleep(args.backoff * (2 ** attempt))
+
+
+def run_ingestion(args):
+    """Fetch every pending (dataset, wallet) pair into append-only shards."""
+    work_dir = Path(args.out_dir) / ".ingest"
+    if args.fresh and work_dir.exists():
+        shutil.rmtree(work_dir)
+
+    wallets = load_wallet_list(args.wallets)
+    if args.limit:
+        wallets = wallets[:args.limit]
+
+    bucket = TokenBucket(args.rate, args.burst)
+    run_id = time.strftime("%Y%m%d-%H%M%S")
+    writers = {}
+    pending = []
+    for dataset in args.datasets:
+        done = completed_wallets(work_dir, dataset)
+        todo = [wallet for wallet in wallets if wallet not in done]
+        print(f"{dataset}: {len(done)} wallets already done, {len(todo)} to fetch")
+        if todo:
+            writers[dataset] = ShardWriter(work_dir / "shards" / dataset / f"part-{run_id}.jsonl")
+            pending.extend((dataset, wallet) for wallet in todo)
+
+    errors_path = work_dir / "errors.jsonl"
+    errors_path.parent.mkdir(parents=True, exist_ok=True)
+    failed = 0
+    finished = 0
+    started = time.time()
+
+    def task(dataset, wallet):
+        rows = fetch_with_retry(DATASETS[dataset][2], wallet, args, bucket)
+        writers[dataset].write(wallet, rows)
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool, open(errors_path, "a", encoding="utf-8") as errors:
+        in_flight = {}
+        queue = iter(pending)
+        max_in_flight = args.workers * 4
+        while True:
+            # Keep a bounded number of tasks queued so memory stays flat for large wallet lists
+            for dataset, wallet in queue:
+                in_flight[pool.submit(task, dataset, wallet)] = (dataset, wallet)
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                dataset, wallet = in_flight.pop(future)
+                finished += 1
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"Error fetching {dataset} for {wallet}: {e}")
+                    errors.write(json.dumps({"dataset": dataset, "wallet": wallet, "error": str(e)}) + "\n")
+                    errors.flush()
+                if finished % 100 == 0:
+                    rate = finished / max(time.time() - started, 1e-9)
+                    print(f"{finished}/{len(pending)} fetched ({rate:.1f}/s, {failed} failed)")
+
+    for writer in writers.values():
+        writer.close()
+    print(f"Ingestion finished: {finished - failed} fetched, {failed} failed in {time.time() - started:.1f}s")
+    if failed:
+        print(f"Failed wallets are listed in {errors_path}; rerun to retry them")
+    return failed
+
+
+def merge_shards(out_dir, datasets, columnar=False):
+    """Merge shard records into the CSVs that load_wallet_data reads.
+
+    Rows of re-fetched wallets replace their previous rows; all other rows of
+    the existing CSV are kept. Each CSV is replaced atomically and always
+    carries the dataset's wallet key column, so the next merge can replace
+    rows even for CSVs that were created without one. The shards of every
+    merged dataset are then discarded (see discard_merged).
+    """
+    out_dir = Path(out_dir)
+    work_dir = out_dir / ".ingest"
+    merged_datasets = []
+    for dataset in datasets:
+        filename, key, _ = DATASETS[dataset]
+        records = {}
+        for wallet, rows in read_shards(work_dir / "shards" / dataset):
+            records[wallet] = rows
+        if not records:
+            print(f"{dataset}: no shards to merge")
+            continue
+
+        new_rows = pd.DataFrame([row for rows in records.values() for row in rows])
+        target = out_dir / filename
+        existing = pd.DataFrame()
+        if target.exists() and target.stat().st_size > 0:
+            existing = pd.read_csv(target)
+            if key not in existing.columns and not existing.empty:
+                # Rows written without a wallet key (the bundled NFT CSV has none) cannot
+                # be attributed to a wallet. Keep them unkeyed and write the key column,
+                # so from now on re-fetched wallets replace the rows they were merged with
+                print(f"{dataset}: {filename} has no {key} column; keeping its {len(existing)} rows "
+                      f"as unattributed and adding the column")
+                existing[key] = None
+            if key in existing.columns:
+                existing = existing[~existing[key].isin(list(records))]
+
+        frames = [df for df in (existing, new_rows) if not df.empty]
+        if not frames:
+            print(f"{dataset}: {len(records)} wallets merged, no rows to write")
+            merged_datasets.append(dataset)
+            continue
+        merged = pd.concat(frames, ignore_index=True)
+        tmp_path = target.with_suffix(".csv.tmp")
+        merged.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, target)
+        print(f"{dataset}: merged {len(records)} wallets ({len(new_rows)} rows) into {target}")
+
+        if columnar and dataset in TABLE_FILES:
+            load_table_cached(target, dataset, out_dir / ".cache")
+        merged_datasets.append(dataset)
+
+    discard_merged(work_dir, merged_datasets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest wallet data from the Moralis API")
+    parser.add_argument("command", nargs="?", choices=["run", "merge"], default="run",
+                        help="run: fetch and merge (default); merge: only merge existing shards")
+    parser.add_argument("--wallets", type=str, default="web3_kgenX_new/wallets.csv",
+                        help="CSV with a wallet_ID column")
+    parser.add_argument("--out-dir", type=str, default="web3_kgenX_new", help="Directory load_wallet_data reads")
+    parser.add_argument("--datasets", nargs="+", choices=list(DATASETS),
+                        default=["networth", "tokens", "stats", "nfts", "defi"], help="Datasets to refresh")
+    parser.add_argument("--chain", type=str, default="eth", help="Chain for chain-specific endpoints")
+    parser.add_argument("--protocol", type=str, default="uniswap-v2", help="DeFi protocol to fetch positions for")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent fetch workers")
+    parser.add_argument("--rate", type=float, default=20.0, help="Sustained Moralis requests per second")
+    parser.add_argument("--burst", type=int, default=None, help="Maximum request burst (defaults to --rate)")
+    parser.add_argument("--retries", type=int, default=3, help="Retries for rate-limited or failed requests")
+    parser.add_argument("--backoff", type=float, default=1.0, help="Initial retry backoff in seconds")
+    parser.add_argument("--limit", type=int, help="Only ingest the first N wallets")
+    parser.add_argument("--fresh", action="store_true", help="Discard the shards of an unfinished run and start over")
+    parser.add_argument("--no-merge", action="store_true", help="Fetch only, leave the shards unmerged")
+    parser.add_argument("--columnar", action="store_true", help="Rebuild the Parquet cache after merging")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        failed = run_ingestion(args)
+        if failed and not args.no_merge:
+            # Merging would end the run; keep it open so a rerun only retries the failed wallets
+            print("Shards were not merged because some wallets failed; "
+                  "rerun to retry them, or run `python ingest.py merge` to merge what was fetched")
+        if failed or args.no_merge:
+            return
+    merge_shards(args.out_dir, args.datasets, columnar=args.columnar)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Condition, Lock
+
+
+class QueueFull(RuntimeError):
+    """The job queue already holds its maximum number of unfinished jobs."""
+
+
+class ArtifactStore:
+    """Content-addressed files: every artifact is stored under its SHA-256.
+
+    Identical artifacts share one file, and a digest never refers to
+    different content, so artifacts can be served and cached by digest.
+    """
+
+    def __init__(self, root, suffix=".html"):
+        """
+        Args:
+            root: Directory holding the artifacts
+            suffix: File extension of the stored artifacts
+        """
+        self.root = Path(root)
+        self.suffix = suffix
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = Lock()
+
+    def path(self, digest):
+        """Return the path of an artifact; digest must be a SHA-256 hex string"""
+        if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+            raise ValueError(f"Invalid artifact digest {digest!r}")
+        return self.root / digest[:2] / f"{digest}{self.suffix}"
+
+    def put(self, data):
+        """Store bytes and return their digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        target = self.path(digest)
+        target.parent.mkdir(exist_ok=True)
+        with self._lock:
+            if target.exists():
+                # Mark the artifact as fresh so prune keeps it
+                os.utime(target)
+                return digest
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=target.parent)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, target)
+        return digest
+
+    def exists(self, digest):
+        return self.path(digest).exists()
+
+    def touch(self, digest):
+        """Mark a stored artifact as fresh so prune keeps it; returns False when it is gone
+
+        Taken under the prune lock, so an artifact reported as present
+        survives at least min_age seconds for the job that reuses it.
+        """
+        with self._lock:
+            try:
+                os.utime(self.path(digest))
+            except FileNotFoundError:
+                return False
+        return True
+
+    def prune(self, keep, min_age=60):
+        """Delete every artifact whose digest is not in keep; returns the number deleted
+
+        Artifacts stored in the last min_age seconds are kept, since their job
+        may not have recorded them yet.
+        """
+        removed = 0
+        cutoff = time.time() - min_age
+        with self._lock:
+            for path in self.root.glob(f"*/*{self.suffix}"):
+                if path.stem not in keep and path.stat().st_mtime < cutoff:
+                    path.unlink(missing_ok=True)
+                    removed += 1
+        return removed
+
+
+class JobQueue:
+    """Runs jobs on a worker pool and keeps their state for polling.
+
+    At most `max_depth` jobs may be queued or running; submit raises
+    QueueFull beyond that. Finished jobs are dropped `ttl` seconds after
+    they finished, together with artifacts no remaining job refers to.
+    """
+
+    def __init__(self, store, workers=2, max_depth=64, ttl=3600):
+        """
+        Args:
+            store: ArtifactStore holding the jobs' artifacts
+            workers: Jobs run concurrently
+            max_depth: Maximum number of unfinished jobs
+            ttl: Seconds a finished job and its artifact are kept
+        """
+        self.store = store
+        self.max_depth = max_depth
+        self.ttl = ttl
+        self._jobs = {}
+        self._changed = Condition(Lock())
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-job")
+
+    def submit(self, fn, **params):
+        """Queue fn(**params) and return the job's id.
+
+        fn must return a dict with an "artifact" digest and may add other
+        result fields.
+        """
+        self.expire()
+        with self._changed:
+            unfinished = sum(job["state"] in ("queued", "running") for job in self._jobs.values())
+            if unfinished >= self.max_depth:
+                raise QueueFull(f"{unfinished} jobs are already queued or running")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "state": "queued",
+                "params": params,
+                "created": time.time(),
+                "started": None,
+                "finished": None,
+                "result": None,
+                "error": None
+            }
+        self._executor.submit(self._run, job_id, fn, params)
+        return job_id
+
+    def _run(self, job_id, fn, params):
+        self._update(job_id, state="running", started=time.time())
+        try:
+            result = fn(**params)
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self._update(job_id, state="failed", error=str(e), finished=time.time())
+        else:
+            self._update(job_id, state="done", result=result, finished=time.time())
+
+    def _update(self, job_id, **fields):
+        with self._changed:
+            self._jobs[job_id].update(fields)
+            self._changed.notify_all()
+
+    def get(self, job_id, wait=0):
+        """Return a copy of a job, or None if it is unknown or expired.
+
+        Args:
+            wait: Seconds to wait for the job to finish before returning (long-poll)
+        """
+        self.expire()
+        deadline = time.monotonic() + wait
+        with self._changed:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return None
+                remaining = deadline - time.monotonic()
+                if job["state"] in ("done", "failed") or remaining <= 0:
+                    return dict(job)
+                self._changed.wait(remaining)
+
+    def expire(self):
+        """Drop finished jobs older than ttl and the artifacts only they referenced"""
+        now = time.time()
+        with self._changed:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["finished"] is not None and now - job["finished"] > self.ttl
+            ]
+            if not expired:
+                return 0
+            for job_id in expired:
+                del self._jobs[job_id]
+            keep = {
+                job["result"]["artifact"] for job in self._jobs.values()
+                if job["result"] and job["result"].get("artifact")
+            }
+        self.store.prune(keep)
+        return len(expired)
+
+    def stats(self):
+        """Number of jobs in each state"""
+        with self._changed:
+            counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+            for job in self._jobs.values():
+                counts[job["state"]] += 1
+        counts["max_depth"] = self.max_depth
+        return counts
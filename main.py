@@ -1,13 +1,28 @@
-from flask import Flask, request, jsonify, send_file
-from threading import Lock
+import argparse
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Flask, Response, g, request, jsonify, send_file
+from threading import Event, Lock, Thread
 from dataLoading import (
     load_wallet_data,
+    reload_wallet_data,
+    changed_tables,
     extract_wallet_features,
-    classify_wallet,
-    fetch_wallet_data_from_api
+    extract_features_many,
+    fetch_wallet_data_from_api,
+    query_cohort,
+    segment_labels,
+    COHORT_RANGE_FEATURES,
+    moralis_cache
 )
-from test import WalletPersonaGenerator
-from visualization import generate_html_report
+from inference import InferencePool
+from jobs import ArtifactStore, JobQueue, QueueFull
+from cache import TTLCache
+from visualization import render_html_report, report_etag
+import metrics
 
 app = Flask(__name__)
 
@@ -21,32 +36,337 @@ class ModelManager:
                 cls._instance = super(ModelManager, cls).__new__(cls)
                 cls._instance.generator = None
                 cls._instance.data_dict = None
+                cls._instance.data_dir = "web3_kgenX_new"
+                cls._instance.use_cache = True
+                # Separate locks so data-only requests never wait for the model to load
+                cls._instance._model_lock = Lock()
+                cls._instance._data_lock = Lock()
+                cls._instance.status = {
+                    component: {"state": "pending", "started": None, "duration": None, "error": None}
+                    for component in ("data", "model", "warmup", "reload")
+                }
+                cls._instance.last_reload = None
+                cls._instance.warmup_thread = None
+                cls._instance.watcher_thread = None
             return cls._instance
     
+    def _track(self, component, fn):
+        """Run fn while recording its state and duration in self.status"""
+        status = self.status[component]
+        status.update(state="loading", started=time.time(), duration=None, error=None)
+        started = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            status.update(state="failed", error=str(e), duration=round(time.perf_counter() - started, 3))
+            raise
+        status.update(state="ready", duration=round(time.perf_counter() - started, 3))
+        return result
+    
     def load_model(self, hf_token=None):
-        """Initialize the model if not already loaded"""
-        with self._lock:
+        """Initialize the model if not already loaded
+        
+        With PERSONA_WORKERS > 0 (the default) the model runs in separate
+        worker processes behind an InferencePool; 0 loads it in this process.
+        """
+        with self._model_lock:
             if self.generator is None:
-                print("Initializing WalletPersonaGenerator...")
-                self.generator = WalletPersonaGenerator(hf_token=hf_token)
+                config = dict(
+                    hf_token=hf_token,
+                    max_batch_size=int(os.getenv("PERSONA_MAX_BATCH_SIZE", "8")),
+                    batch_window_ms=float(os.getenv("PERSONA_BATCH_WINDOW_MS", "25")),
+                    cache_size=int(os.getenv("PERSONA_CACHE_SIZE", "256")),
+                    cache_path=os.getenv("PERSONA_CACHE_PATH") or None,
+                    model_id=os.getenv("PERSONA_MODEL_ID", "mistralai/Mistral-7B-Instruct-v0.2"),
+                    backend=os.getenv("PERSONA_BACKEND") or None,
+                    num_threads=int(os.getenv("PERSONA_NUM_THREADS", "0")) or None
+                )
+                workers = int(os.getenv("PERSONA_WORKERS", "1"))
+                if workers > 0:
+                    print(f"Starting {workers} inference worker(s)...")
+                    self.generator = self._track("model", lambda: InferencePool(
+                        config,
+                        workers=workers,
+                        timeout=float(os.getenv("PERSONA_TIMEOUT", "300"))
+                    ).start())
+                else:
+                    # Imported on first use: it pulls in torch and transformers
+                    from test import WalletPersonaGenerator
+                    print("Initializing WalletPersonaGenerator...")
+                    self.generator = self._track("model", lambda: WalletPersonaGenerator(**config))
                 print("Model initialized successfully")
     
-    def load_data(self, data_dir="web3_kgenX_new"):
+    def load_data(self, data_dir="web3_kgenX_new", use_cache=True):
         """Load wallet data if not already loaded"""
-        with self._lock:
+        with self._data_lock:
             if self.data_dict is None:
-                self.data_dict = load_wallet_data(data_dir)
+                self.data_dict = self._track("data", lambda: load_wallet_data(data_dir, use_cache=use_cache))
+                self.data_dir = data_dir
+                self.use_cache = use_cache
                 print(f"Data loaded from {data_dir}")
+    
+    def reload_data(self):
+        """Merge changed wallet CSVs into a new data snapshot and swap it in
+        
+        The previous snapshot is never modified, so requests that already hold
+        it finish with a consistent view. The model stays loaded.
+        
+        Returns:
+            Reload summary: rows added and removed per table, changed wallets, duration
+        """
+        with self._data_lock:
+            if self.data_dict is None:
+                raise RuntimeError("Wallet data is not loaded yet")
+            data, summary = self._track("reload", lambda: reload_wallet_data(
+                self.data_dict, self.data_dir, use_cache=self.use_cache
+            ))
+            self.data_dict = data
+            self.last_reload = dict(summary, finished=time.time())
+        print(f"Data reloaded in {summary['duration']}s: {summary['rows_changed']} rows changed, "
+              f"{summary['wallets_changed']} wallets affected")
+        return summary
+    
+    def watch_data(self, interval):
+        """Reload the data whenever a wallet CSV changes, checking every `interval` seconds"""
+        def run():
+            while True:
+                time.sleep(interval)
+                data = self.data_dict
+                try:
+                    if data is not None and changed_tables(data, self.data_dir):
+                        self.reload_data()
+                except Exception as e:
+                    print(f"Data reload failed: {e}")
+        
+        if self.watcher_thread is None:
+            self.watcher_thread = Thread(target=run, name="data-watcher", daemon=True)
+            self.watcher_thread.start()
+        return self.watcher_thread
+    
+    def warm_up(self, hf_token=None, data_dir="web3_kgenX_new"):
+        """Load the data and the model and run a warm-up generation in a background thread"""
+        def run():
+            try:
+                self.load_data(data_dir)
+                self.load_model(hf_token=hf_token)
+                with self._model_lock:
+                    if self.status["warmup"]["state"] != "ready":
+                        self._track("warmup", self.generator.warm_up)
+            except Exception as e:
+                print(f"Background warm-up failed: {e}")
+        
+        if self.warmup_thread is None:
+            self.warmup_thread = Thread(target=run, name="model-warmup", daemon=True)
+            self.warmup_thread.start()
+        return self.warmup_thread
+    
+    def is_ready(self):
+        """True once the data and the model are loaded"""
+        return self.data_dict is not None and self.generator is not None
+    
+    def load_progress(self):
+        """Per-component load state, start time and duration in seconds"""
+        now = time.time()
+        progress = {}
+        for component, status in self.status.items():
+            progress[component] = dict(status)
+            if status["state"] == "loading":
+                progress[component]["elapsed"] = round(now - status["started"], 3)
+        return progress
 
 model_manager = ModelManager()
 
+
+class SingleFlight:
+    """Deduplicate concurrent calls that share a key.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for it and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._calls = {}
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"done": Event(), "result": None, "error": None}
+                self._calls[key] = call
+            else:
+                self.shared += 1
+
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fn()
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call["done"].set()
+        return call["result"]
+
+
+# In-flight persona generations keyed by (wallet_address, detailed, use_cache)
+persona_flight = SingleFlight()
+
+# Shared by the batch endpoints for API fallbacks and persona generations
+batch_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("BATCH_WORKERS", "32")),
+    thread_name_prefix="wallet-batch"
+)
+MAX_BATCH_WALLETS = int(os.getenv("MAX_BATCH_WALLETS", "500"))
+# Wallets per page of a cohort query
+DEFAULT_COHORT_PAGE = 100
+MAX_COHORT_PAGE = int(os.getenv("MAX_COHORT_PAGE", "1000"))
+
+# Report jobs and their content-addressed HTML artifacts
+artifact_store = ArtifactStore(os.getenv("REPORT_STORE_DIR", ".artifacts"))
+report_jobs = JobQueue(
+    artifact_store,
+    workers=int(os.getenv("REPORT_WORKERS", "2")),
+    max_depth=int(os.getenv("REPORT_QUEUE_DEPTH", "64")),
+    ttl=float(os.getenv("REPORT_JOB_TTL", "3600"))
+)
+MAX_JOB_WAIT = 60
+# Report ETag (hash of features and persona) -> artifact digest
+rendered_reports = TTLCache(maxsize=4096, ttl=float(os.getenv("REPORT_JOB_TTL", "3600")))
+# Artifacts never change, so clients may cache them for as long as they are kept
+MAX_ARTIFACT_AGE = int(float(os.getenv("REPORT_JOB_TTL", "3600")))
+
+
+def persona_stats(features):
+    """Summary stats returned next to a generated persona."""
+    return {
+        "total_networth": features.get('total_networth', 0),
+        "native_balance": features.get('native_balance', 0),
+        "token_balance_usd": features.get('token_balance_usd', 0),
+        "chain": features.get('chain', 'unknown'),
+        "wallet_health_score": features.get('wallet_health_score', 0),
+        "risk_score": features.get('risk_score', 0),
+        "activity_score": features.get('activity_score', 0)
+    }
+
+
+def wallet_stats(features):
+    """Stats returned by the wallet stats endpoints."""
+    return {
+        "total_networth": features.get('total_networth', 0),
+        "native_balance": features.get('native_balance', 0),
+        "token_balance_usd": features.get('token_balance_usd', 0),
+        "chain": features.get('chain', 'unknown'),
+        "native_balance_usd": features.get('native_balance_usd', 0),
+        "active_chains": features.get('active_chains', 0),
+        "chain_breakdown": features.get('chain_breakdown', []),
+        "token_count": features.get('token_count', 0),
+        "top_tokens": features.get('top_tokens', []),
+        "defi_protocols": features.get('defi_protocols', 0),
+        "total_defi_usd": features.get('total_defi_usd', 0),
+        "nft_count": features.get('nft_count', 0),
+        "nft_collections": features.get('unique_nft_collections', 0),
+        "transactions_total": features.get('transactions_total', 0),
+        "wallet_health_score": features.get('wallet_health_score', 0),
+        "risk_score": features.get('risk_score', 0),
+        "activity_score": features.get('activity_score', 0)
+    }
+
+
+def build_persona(wallet_address, detailed, use_cache=True, features=None):
+    """Extract a wallet's features and generate its persona.
+
+    Returns (features, persona), or None when no data exists for the wallet.
+    Callers share the result through persona_flight and must not modify it.
+
+    Args:
+        features: Already extracted features of the wallet (extracted here when None)
+    """
+    if features is None:
+        features = extract_wallet_features(wallet_address, model_manager.data_dict)
+    if not features:
+        return None
+
+    features['address'] = wallet_address
+
+    print("Generating persona...")
+    persona = model_manager.generator.generate_persona(features, detailed=detailed, use_cache=use_cache)
+    return features, persona
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Count every request and time it up to the response headers (streams keep running after)"""
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    metrics.count("http_requests_total", endpoint=endpoint, status=response.status_code)
+    started = g.get("request_started")
+    if started is not None:
+        metrics.observe("http_request_seconds", time.perf_counter() - started, endpoint=endpoint)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Latency histograms and counters of the API process and the inference workers (Prometheus text format)"""
+    snapshots = [metrics.registry.snapshot()]
+    generator = model_manager.generator
+    if isinstance(generator, InferencePool):
+        try:
+            snapshots.extend(generator.metrics_snapshots())
+        except Exception as e:
+            print(f"Could not collect inference worker metrics: {e}")
+    return Response(metrics.render(snapshots), mimetype="text/plain; version=0.0.4")
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """API health check endpoint"""
+    """API health check endpoint
+    
+    The server is live as soon as it answers; it is ready once the data and
+    the model are loaded.
+    """
+    generator = model_manager.generator
     return jsonify({
         "status": "healthy",
-        "model_loaded": model_manager.generator is not None,
-        "data_loaded": model_manager.data_dict is not None
+        "live": True,
+        "ready": model_manager.is_ready(),
+        "model_loaded": generator is not None,
+        "data_loaded": model_manager.data_dict is not None,
+        "loading": model_manager.load_progress(),
+        "last_reload": model_manager.last_reload,
+        "inference": generator.stats() if isinstance(generator, InferencePool) else None,
+        "report_jobs": report_jobs.stats()
+    })
+
+@app.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 200 once the data and the model are loaded, 503 before"""
+    ready = model_manager.is_ready()
+    return jsonify({"ready": ready, "loading": model_manager.load_progress()}), 200 if ready else 503
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Cache hit/miss counters"""
+    generator = model_manager.generator
+    persona = None
+    if generator is not None:
+        try:
+            persona = generator.persona_cache_stats()
+        except Exception as e:
+            print(f"Could not collect persona cache stats: {e}")
+    return jsonify({
+        "moralis": moralis_cache.stats(),
+        "persona": persona,
+        "persona_requests_shared": persona_flight.shared
     })
 
 @app.route('/api/wallet/analyze', methods=['POST'])
@@ -67,37 +387,85 @@ def analyze_wallet():
             model_manager.load_data(data.get('data_dir', 'web3_kgenX_new'))
         
         print(f"Analyzing wallet {wallet_address}...")
-        features = extract_wallet_features(wallet_address, model_manager.data_dict)
+        use_cache = not data.get('bypass_cache', False)
+        result = persona_flight.do(
+            (wallet_address, detailed, use_cache),
+            lambda: build_persona(wallet_address, detailed, use_cache)
+        )
         
-        if not features:
+        if not result:
             return jsonify({
                 "error": "No data found for wallet",
                 "wallet_address": wallet_address
             }), 404
             
-        features['address'] = wallet_address
-        features['classifications'] = classify_wallet(features)
-        
-        print("Generating persona...")
-        persona = model_manager.generator.generate_persona(features, detailed=detailed)
+        features, persona = result
         
         response = {
             "wallet_address": wallet_address,
             "persona": persona,
             "classifications": features['classifications'],
-            "stats": {
-                "total_networth": features.get('total_networth', 0),
-                "native_balance": features.get('native_balance', 0),
-                "token_balance_usd": features.get('token_balance_usd', 0),
-                "chain": features.get('chain', 'unknown'),
-                "wallet_health_score": features.get('wallet_health_score', 0),
-                "risk_score": features.get('risk_score', 0),
-                "activity_score": features.get('activity_score', 0)
-            }
+            "stats": persona_stats(features)
         }
         
         return jsonify(response)
         
+    except TimeoutError as e:
+        return jsonify({
+            "error": str(e),
+            "message": "Persona generation timed out"
+        }), 504
+    except Exception as e:
+        return jsonify({
+            "error": str(e),
+            "message": "An error occurred while processing the request"
+        }), 500
+
+@app.route('/api/wallet/analyze/stream', methods=['POST'])
+def analyze_wallet_stream():
+    """Analyze a wallet and stream the persona as NDJSON while it is generated"""
+    try:
+        data = request.json
+        if not data or 'wallet_address' not in data:
+            return jsonify({"error": "Missing wallet_address parameter"}), 400
+            
+        wallet_address = data['wallet_address']
+        detailed = data.get('detailed', True)
+        use_cache = not data.get('bypass_cache', False)
+        
+        if model_manager.generator is None:
+            model_manager.load_model(hf_token=data.get('hf_token'))
+        
+        if model_manager.data_dict is None:
+            model_manager.load_data(data.get('data_dir', 'web3_kgenX_new'))
+        
+        features = extract_wallet_features(wallet_address, model_manager.data_dict)
+        
+        if not features:
+            return jsonify({
+                "error": "No data found for wallet",
+                "wallet_address": wallet_address
+            }), 404
+            
+        features['address'] = wallet_address
+        generator = model_manager.generator
+        
+        def events():
+            yield json.dumps({
+                "event": "stats",
+                "wallet_address": wallet_address,
+                "classifications": features['classifications'],
+                "stats": persona_stats(features)
+            }) + "\n"
+            try:
+                for text in generator.stream_persona(features, detailed=detailed, use_cache=use_cache):
+                    yield json.dumps({"event": "token", "text": text}) + "\n"
+                yield json.dumps({"event": "done"}) + "\n"
+            except Exception as e:
+                yield json.dumps({"event": "error", "error": str(e)}) + "\n"
+        
+        return Response(events(), mimetype='application/x-ndjson')
+        
     except Exception as e:
         return jsonify({
             "error": str(e),
@@ -122,27 +490,10 @@ def get_wallet_stats():
                 "error": "No data found for wallet",
                 "wallet_address": wallet_address
             }), 404
-            
-        features['classifications'] = classify_wallet(features)
     
         response = {
             "wallet_address": wallet_address,
-            "stats": {
-                "total_networth": features.get('total_networth', 0),
-                "native_balance": features.get('native_balance', 0),
-                "token_balance_usd": features.get('token_balance_usd', 0),
-                "chain": features.get('chain', 'unknown'),
-                "token_count": features.get('token_count', 0),
-                "top_tokens": features.get('top_tokens', []),
-                "defi_protocols": features.get('defi_protocols', 0),
-                "total_defi_usd": features.get('total_defi_usd', 0),
-                "nft_count": features.get('nft_count', 0),
-                "nft_collections": features.get('unique_nft_collections', 0),
-                "transactions_total": features.get('transactions_total', 0),
-                "wallet_health_score": features.get('wallet_health_score', 0),
-                "risk_score": features.get('risk_score', 0),
-                "activity_score": features.get('activity_score', 0)
-            },
+            "stats": wallet_stats(features),
             "classifications": features['classifications']
         }
         
@@ -154,40 +505,300 @@ def get_wallet_stats():
             "message": "An error occurred while processing the request"
         }), 500
 
-@app.route('/api/wallet/report', methods=['POST'])
-def generate_report():
-    """Generate an HTML report for a wallet"""
+def parse_wallet_batch(data):
+    """Return the deduplicated wallet_addresses of a batch request, or raise ValueError"""
+    wallets = (data or {}).get('wallet_addresses')
+    if not isinstance(wallets, list) or not wallets:
+        raise ValueError("Missing wallet_addresses parameter (a non-empty list)")
+    if not all(isinstance(wallet, str) and wallet for wallet in wallets):
+        raise ValueError("wallet_addresses must be a list of addresses")
+    wallets = list(dict.fromkeys(wallets))
+    if len(wallets) > MAX_BATCH_WALLETS:
+        raise ValueError(f"At most {MAX_BATCH_WALLETS} wallets per batch")
+    return wallets
+
+def stream_batch(ready, futures):
+    """NDJSON lines for already finished results, then for futures as they complete
+    
+    Args:
+        ready: (wallet_address, event dict) pairs to emit first
+        futures: Dict mapping futures (returning an event dict) to their wallet address
+    """
+    errors = 0
+    for wallet_address, event in ready:
+        errors += event["event"] == "error"
+        yield json.dumps(event) + "\n"
+    for future in as_completed(futures):
+        wallet_address = futures[future]
+        try:
+            event = future.result()
+        except Exception as e:
+            event = {"event": "error", "wallet_address": wallet_address, "error": str(e)}
+        errors += event["event"] == "error"
+        yield json.dumps(event) + "\n"
+    yield json.dumps({"event": "done", "count": len(ready) + len(futures), "errors": errors}) + "\n"
+
+def missing_wallet_event(wallet_address):
+    return {"event": "error", "wallet_address": wallet_address, "error": "No data found for wallet"}
+
+@app.route('/api/wallet/stats/batch', methods=['POST'])
+def get_wallet_stats_batch():
+    """Stats of many wallets, streamed as NDJSON in completion order
+    
+    Wallets in the local data are looked up together in the precomputed
+    feature table and come first; the others are fetched from the API
+    concurrently.
+    """
     try:
         data = request.json
-        if not data or 'wallet_address' not in data:
-            return jsonify({"error": "Missing wallet_address parameter"}), 400
-            
-        wallet_address = data['wallet_address']
-        detailed = data.get('detailed', True)
+        try:
+            wallets = parse_wallet_batch(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        if model_manager.data_dict is None:
+            model_manager.load_data(data.get('data_dir', 'web3_kgenX_new'))
+        data_dict = model_manager.data_dict
+        
+        def stats_event(wallet_address, features):
+            if not features:
+                return missing_wallet_event(wallet_address)
+            return {
+                "event": "result",
+                "wallet_address": wallet_address,
+                "stats": wallet_stats(features),
+                "classifications": features['classifications']
+            }
+        
+        local = extract_features_many(wallets, data_dict)
+        ready = [(wallet, stats_event(wallet, features)) for wallet, features in local.items()]
+        futures = {
+            batch_executor.submit(
+                lambda wallet: stats_event(wallet, extract_wallet_features(wallet, data_dict)), wallet
+            ): wallet
+            for wallet in wallets if wallet not in local
+        }
+        
+        return Response(stream_batch(ready, futures), mimetype='application/x-ndjson')
+        
+    except Exception as e:
+        return jsonify({
+            "error": str(e),
+            "message": "An error occurred while processing the request"
+        }), 500
+
+def parse_cohort_query(args, segments):
+    """Return the query_cohort keyword arguments of a cohort request, or raise ValueError"""
+    labels = [label.strip() for label in args.get('labels', '').split(',') if label.strip()]
+    unknown = [label for label in labels if label not in segments["labels"]]
+    if unknown:
+        raise ValueError(f"Unknown labels: {', '.join(unknown)}")
+    
+    ranges = {}
+    for feature in COHORT_RANGE_FEATURES:
+        bounds = []
+        for prefix in ('min_', 'max_'):
+            value = args.get(prefix + feature)
+            if value is None:
+                bounds.append(None)
+                continue
+            try:
+                number = float(value)
+            except ValueError:
+                number = math.nan
+            # nan and inf would parse but match nothing (or everything) silently
+            if not math.isfinite(number):
+                raise ValueError(f"{prefix}{feature} must be a number")
+            bounds.append(number)
+        if None not in bounds and bounds[0] > bounds[1]:
+            raise ValueError(f"min_{feature} must not be greater than max_{feature}")
+        if bounds != [None, None]:
+            ranges[feature] = tuple(bounds)
+    
+    try:
+        offset = int(args.get('offset', 0))
+        limit = int(args.get('limit', DEFAULT_COHORT_PAGE))
+    except ValueError:
+        raise ValueError("offset and limit must be integers")
+    if offset < 0 or not 1 <= limit <= MAX_COHORT_PAGE:
+        raise ValueError(f"offset must be >= 0 and limit between 1 and {MAX_COHORT_PAGE}")
+    
+    count_only = args.get('count_only', '').lower() in ("1", "true", "yes")
+    return {
+        "labels": labels,
+        "chain": args.get('chain') or None,
+        "ranges": ranges,
+        "offset": offset,
+        "limit": 0 if count_only else limit
+    }
+
+@app.route('/api/cohorts', methods=['GET'])
+def get_cohort():
+    """Wallets matching classification labels, a chain and feature ranges
+    
+    Served from the segment index built when the data is loaded, so a query
+    costs about the size of its most selective filter, not the wallet count.
+    """
+    try:
+        if model_manager.data_dict is None:
+            model_manager.load_data(request.args.get('data_dir', 'web3_kgenX_new'))
+        # One snapshot for the whole request, even if a reload swaps it meanwhile
+        data_dict = model_manager.data_dict
+        segments = data_dict["segments"]
+        
+        try:
+            query = parse_cohort_query(request.args, segments)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        total, positions = query_cohort(segments, **query)
+        response = {"total": total}
+        if query["limit"] == 0:
+            return jsonify(response)
+        
+        rows = data_dict["features"].iloc[positions][["chain", *COHORT_RANGE_FEATURES]].to_dict(orient="records")
+        response.update({
+            "offset": query["offset"],
+            "limit": query["limit"],
+            "wallets": [
+                {"wallet_address": wallet, "classifications": labels, **row}
+                for wallet, labels, row in zip(
+                    segments["wallets"][positions].tolist(), segment_labels(segments, positions), rows
+                )
+            ]
+        })
+        return jsonify(response)
+        
+    except Exception as e:
+        return jsonify({
+            "error": str(e),
+            "message": "An error occurred while processing the request"
+        }), 500
 
+@app.route('/api/wallet/analyze/batch', methods=['POST'])
+def analyze_wallet_batch():
+    """Analyze many wallets, streaming each persona as NDJSON as soon as it is generated
+    
+    All personas are submitted at once, so the generator batches them
+    together.
+    """
+    try:
+        data = request.json
+        try:
+            wallets = parse_wallet_batch(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        detailed = data.get('detailed', True)
+        use_cache = not data.get('bypass_cache', False)
+        
         if model_manager.generator is None:
             model_manager.load_model(hf_token=data.get('hf_token'))
         
         if model_manager.data_dict is None:
             model_manager.load_data(data.get('data_dir', 'web3_kgenX_new'))
         
-        features = extract_wallet_features(wallet_address, model_manager.data_dict)
+        local = extract_features_many(wallets, model_manager.data_dict)
         
-        if not features:
-            return jsonify({
-                "error": "No data found for wallet",
-                "wallet_address": wallet_address
-            }), 404
-            
-        features['address'] = wallet_address
-        features['classifications'] = classify_wallet(features)
+        def analyze(wallet_address):
+            result = persona_flight.do(
+                (wallet_address, detailed, use_cache),
+                lambda: build_persona(wallet_address, detailed, use_cache, local.get(wallet_address))
+            )
+            if not result:
+                return missing_wallet_event(wallet_address)
+            features, persona = result
+            return {
+                "event": "result",
+                "wallet_address": wallet_address,
+                "persona": persona,
+                "classifications": features['classifications'],
+                "stats": persona_stats(features)
+            }
+        
+        futures = {batch_executor.submit(analyze, wallet): wallet for wallet in wallets}
+        return Response(stream_batch([], futures), mimetype='application/x-ndjson')
         
-        persona = model_manager.generator.generate_persona(features, detailed=detailed)
+    except Exception as e:
+        return jsonify({
+            "error": str(e),
+            "message": "An error occurred while processing the request"
+        }), 500
+
+def run_report_job(wallet_address, detailed, use_cache, hf_token=None, data_dir='web3_kgenX_new'):
+    """Generate a wallet's persona and HTML report; returns the job result"""
+    if model_manager.generator is None:
+        model_manager.load_model(hf_token=hf_token)
+    
+    if model_manager.data_dict is None:
+        model_manager.load_data(data_dir)
+    
+    result = persona_flight.do(
+        (wallet_address, detailed, use_cache),
+        lambda: build_persona(wallet_address, detailed, use_cache)
+    )
+    if not result:
+        raise LookupError("No data found for wallet")
+    features, persona = result
+    
+    # Reports with the same features and persona are rendered once
+    etag = report_etag(features, persona)
+    digest = rendered_reports.get(etag)
+    # Touching the reused artifact keeps prune from deleting it before the client fetches it
+    if digest is not None and artifact_store.touch(digest):
+        metrics.count("cache_hits_total", cache="report")
+    else:
+        metrics.count("cache_misses_total", cache="report")
+        digest = artifact_store.put(render_html_report(features, persona).encode("utf-8"))
+        rendered_reports.set(etag, digest)
+    return {"artifact": digest, "classifications": features['classifications']}
+
+def job_response(job):
+    """Public view of a report job"""
+    response = {
+        "job_id": job["id"],
+        "status": job["state"],
+        "wallet_address": job["params"]["wallet_address"],
+        "created": job["created"],
+        "started": job["started"],
+        "finished": job["finished"]
+    }
+    if job["state"] == "done":
+        response["artifact"] = job["result"]["artifact"]
+        response["artifact_url"] = f"/api/artifacts/{job['result']['artifact']}"
+        response["classifications"] = job["result"]["classifications"]
+    elif job["state"] == "failed":
+        response["error"] = job["error"]
+    return response
+
+@app.route('/api/wallet/report', methods=['POST'])
+def generate_report():
+    """Queue the HTML report of a wallet; returns a job id to poll"""
+    try:
+        data = request.json
+        if not data or 'wallet_address' not in data:
+            return jsonify({"error": "Missing wallet_address parameter"}), 400
         
-        output_file = f"persona_{wallet_address[:8]}.html"
-        generate_html_report(features, persona, output_file)
+        try:
+            job_id = report_jobs.submit(
+                run_report_job,
+                wallet_address=data['wallet_address'],
+                detailed=data.get('detailed', True),
+                use_cache=not data.get('bypass_cache', False),
+                hf_token=data.get('hf_token'),
+                data_dir=data.get('data_dir', 'web3_kgenX_new')
+            )
+        except QueueFull as e:
+            response = jsonify({"error": str(e), "message": "Report queue is full, retry later"})
+            response.headers["Retry-After"] = "5"
+            return response, 503
         
-        return send_file(output_file, mimetype='text/html')
+        response = jsonify({
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/api/jobs/{job_id}"
+        })
+        response.headers["Location"] = f"/api/jobs/{job_id}"
+        return response, 202
         
     except Exception as e:
         return jsonify({
@@ -195,6 +806,54 @@ def generate_report():
             "message": "An error occurred while processing the request"
         }), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status of a report job; ?wait=<seconds> long-polls until it finishes"""
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), MAX_JOB_WAIT)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    
+    job = report_jobs.get(job_id, wait=wait)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job", "job_id": job_id}), 404
+    return jsonify(job_response(job))
+
+@app.route('/api/artifacts/<digest>', methods=['GET'])
+def get_artifact(digest):
+    """Serve a finished report by its content digest"""
+    try:
+        path = artifact_store.path(digest)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not path.exists():
+        return jsonify({"error": "Unknown or expired artifact", "artifact": digest}), 404
+    # The digest is the content hash, so If-None-Match gets a 304 without reading the file
+    return send_file(path, mimetype='text/html', max_age=MAX_ARTIFACT_AGE, etag=digest, conditional=True)
+
+@app.route('/api/admin/reload', methods=['POST'])
+def admin_reload():
+    """Pick up changed wallet CSVs without restarting the server
+    
+    Requires the X-Admin-Token header when ADMIN_TOKEN is set.
+    """
+    try:
+        admin_token = os.getenv("ADMIN_TOKEN")
+        if admin_token and request.headers.get("X-Admin-Token") != admin_token:
+            return jsonify({"error": "Invalid admin token"}), 403
+        
+        if model_manager.data_dict is None:
+            return jsonify({"error": "Wallet data is not loaded yet"}), 409
+        
+        summary = model_manager.reload_data()
+        return jsonify(summary)
+        
+    except Exception as e:
+        return jsonify({
+            "error": "Failed to reload wallet data",
+            "message": str(e)
+        }), 500
+
 @app.route('/api/wallet/fetch', methods=['POST'])
 def fetch_wallet():
     """Fetch wallet data directly from API"""
@@ -214,7 +873,6 @@ def fetch_wallet():
             }), 500
             
         features = extract_wallet_features(wallet_address, api_data)
-        features['classifications'] = classify_wallet(features)
         
         response = {
             "wallet_address": wallet_address,
@@ -225,7 +883,8 @@ def fetch_wallet():
                 "chain": features.get('chain', 'unknown')
             },
             "tokens": api_data.get("tokens").to_dict(orient='records') if "tokens" in api_data else [],
-            "classifications": features['classifications']
+            "classifications": features['classifications'],
+            "errors": api_data.get("errors", {})
         }
         
         return jsonify(response)
@@ -237,4 +896,24 @@ def fetch_wallet():
         }), 500
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Wallet persona API server")
+    parser.add_argument("--eager", action="store_true",
+                        help="Load the data and the model in the background at startup")
+    parser.add_argument("--data-dir", type=str, default="web3_kgenX_new", help="Directory with wallet data")
+    parser.add_argument("--watch-interval", type=float, default=float(os.getenv("DATA_RELOAD_INTERVAL", "0")),
+                        help="Reload changed wallet CSVs, checking every N seconds (0 disables)")
+    args = parser.parse_args()
+    
+    if args.eager or os.getenv("EAGER_LOAD", "").lower() in ("1", "true", "yes"):
+        model_manager.warm_up(hf_token=os.getenv("HF_TOKEN"), data_dir=args.data_dir)
+    if args.watch_interval > 0:
+        model_manager.watch_data(args.watch_interval)
+    
+    # No reloader: it would start a second process that loads the model again
+    app.run(
+        debug=os.getenv("FLASK_DEBUG", "").lower() in ("1", "true", "yes"),
+        host='0.0.0.0',
+        port=5000,
+        use_reloader=False,
+        threaded=True
+    )
\ No newline at end of file
@@ -0,0 +1,163 @@
+import functools
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+# Prefix of every exported metric name
+NAMESPACE = "wallet_persona"
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Upper bounds of the generation throughput buckets, in tokens per second
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Every metric this process can record: name -> (type, help, histogram buckets)
+METRICS = {
+    "stage_seconds": ("histogram", "Latency of each processing stage in seconds", LATENCY_BUCKETS),
+    "moralis_request_seconds": ("histogram", "Latency of Moralis API calls in seconds", LATENCY_BUCKETS),
+    "http_request_seconds": ("histogram", "Latency of API requests in seconds", LATENCY_BUCKETS),
+    "persona_tokens_per_second": ("histogram", "Decode throughput of persona generations", RATE_BUCKETS),
+    "persona_generated_tokens_total": ("counter", "Tokens generated for personas", None),
+    "http_requests_total": ("counter", "API requests by endpoint and status code", None),
+    "cache_hits_total": ("counter", "Cache hits by cache", None),
+    "cache_misses_total": ("counter", "Cache misses by cache", None),
+    "api_fallbacks_total": ("counter", "Wallets fetched from Moralis because they have no local data", None),
+    "errors_total": ("counter", "Failed stages", None),
+}
+
+
+class Registry:
+    """Counters and histograms recorded by one process.
+
+    Samples are keyed by metric name and a sorted tuple of label pairs.
+    snapshot() returns them as plain data so samples from other processes
+    (the inference workers) can be merged into one export.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._samples = {name: {} for name in METRICS}
+
+    def count(self, name, amount=1, **labels):
+        """Add amount to a counter"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            samples = self._samples[name]
+            samples[key] = samples.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """Record one value in a histogram"""
+        buckets = METRICS[name][2]
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            sample = self._samples[name].get(key)
+            if sample is None:
+                sample = self._samples[name][key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    sample[0][i] += 1
+                    break
+            sample[1] += value
+            sample[2] += 1
+
+    def snapshot(self):
+        """Copy of every sample: {name: [(labels, value)]}, histograms as (bucket counts, sum, count)"""
+        with self._lock:
+            return {
+                name: [
+                    (key, (list(value[0]), value[1], value[2]) if isinstance(value, list) else value)
+                    for key, value in samples.items()
+                ]
+                for name, samples in self._samples.items()
+            }
+
+
+def merge(snapshots):
+    """Sum several snapshots into one {name: {labels: value}}"""
+    merged = {name: {} for name in METRICS}
+    for snapshot in snapshots:
+        for name, samples in snapshot.items():
+            if name not in merged:
+                continue
+            for key, value in samples:
+                key = tuple(tuple(pair) for pair in key)
+                current = merged[name].get(key)
+                if current is None:
+                    merged[name][key] = (list(value[0]), value[1], value[2]) if isinstance(value, (list, tuple)) else value
+                elif isinstance(value, (list, tuple)):
+                    merged[name][key] = (
+                        [a + b for a, b in zip(current[0], value[0])], current[1] + value[1], current[2] + value[2]
+                    )
+                else:
+                    merged[name][key] = current + value
+    return merged
+
+
+def _labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+def render(snapshots):
+    """Render merged snapshots in the Prometheus text exposition format"""
+    lines = []
+    for name, samples in merge(snapshots).items():
+        kind, help_text, buckets = METRICS[name]
+        full_name = f"{NAMESPACE}_{name}"
+        lines.append(f"# HELP {full_name} {help_text}")
+        lines.append(f"# TYPE {full_name} {kind}")
+        for key, value in sorted(samples.items()):
+            if kind == "counter":
+                lines.append(f"{full_name}{_labels(key)} {value}")
+                continue
+            counts, total, observations = value
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{full_name}_bucket{_labels(key, [('le', bound)])} {cumulative}")
+            lines.append(f"{full_name}_bucket{_labels(key, [('le', '+Inf')])} {observations}")
+            lines.append(f"{full_name}_sum{_labels(key)} {total}")
+            lines.append(f"{full_name}_count{_labels(key)} {observations}")
+    return "\n".join(lines) + "\n"
+
+
+# Samples recorded by this process
+registry = Registry()
+
+
+def count(name, amount=1, **labels):
+    """Add amount to a counter of this process"""
+    registry.count(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    """Record a value in a histogram of this process"""
+    registry.observe(name, value, **labels)
+
+
+@contextmanager
+def span(stage):
+    """Time a block as one stage; a raised exception also counts as an error of the stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        registry.count("errors_total", stage=stage)
+        raise
+    finally:
+        registry.observe("stage_seconds", time.perf_counter() - started, stage=stage)
+
+
+def timed(stage):
+    """Decorator form of span for functions that are one stage as a whole"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,45 +1,306 @@
 import pandas as pd
 import json
 import argparse
+import hashlib
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from dataLoading import load_wallet_data, extract_wallet_features, classify_wallet
-from transformers import AutoModelForCausalLM, AutoTokenizer
+import torch
+from dataLoading import load_wallet_data, extract_wallet_features, extract_features_many
+from transformers import (
+    AutoModelForCausalLM,
+    AutoTokenizer,
+    DynamicCache,
+    StoppingCriteria,
+    StoppingCriteriaList,
+    TextIteratorStreamer
+)
+from transformers.generation.streamers import BaseStreamer
 from huggingface_hub import login
-from visualization import generate_html_report
+from visualization import generate_html_report, export_reports
+from cache import TTLCache
+import metrics
+
+# Sampling parameters of every persona generation (part of the persona cache key)
+SAMPLING_PARAMS = {"temperature": 0.7, "top_p": 0.9, "do_sample": True}
+
+DEFAULT_MODEL_ID = "mistralai/Mistral-7B-Instruct-v0.2"
+
+# Inference backends WalletPersonaGenerator can load the model with:
+#   auto      - device_map/torch_dtype "auto" (GPU when available)
+#   cpu       - float32 weights on CPU
+#   cpu-bf16  - bfloat16 weights on CPU, half the memory of float32
+#   cpu-int8  - dynamic int8 quantization of the Linear layers on CPU
+#   onnx      - ONNX Runtime via optimum (pip install optimum[onnxruntime])
+BACKENDS = ("auto", "cpu", "cpu-bf16", "cpu-int8", "onnx")
+
+# Static instructions that open every persona prompt. They come before the
+# wallet data so their key/values can be computed once and shared by all requests.
+PERSONA_INSTRUCTIONS = {
+    True: (
+        "Create a rich, fictional persona profile for a crypto wallet based on the on-chain data below. "
+        "The persona must include:\n"
+        "1. Crypto Identity: Who they are in the crypto ecosystem\n"
+        "2. Trading Style: Their approach, time horizon, transaction patterns\n"
+        "3. Risk Profile: Their comfort with different types of risk\n"
+        "4. Blockchain Preferences: Why they choose this chain\n"
+        "5. Personalized Recommendations: 3-4 specific products or strategies\n\n"
+        "Format your response as a well-structured markdown document with headers for each section.\n\n"
+    ),
+    False: (
+        "Create a brief crypto persona for the wallet below. "
+        "Include identity type, risk profile, and 1-2 recommendations.\n\n"
+    ),
+}
+
+
+class StopOnEvent(StoppingCriteria):
+    """Stop generation as soon as an Event is set (used to cancel streams and jobs).
+
+    Takes one Event for the whole batch, or a list with one Event (or None)
+    per sequence; a set Event then stops only its own sequence.
+    """
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if not isinstance(self.event, (list, tuple)):
+            return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+        stopped = [event is not None and event.is_set() for event in self.event]
+        return torch.tensor(stopped, dtype=torch.bool, device=input_ids.device)
+
+
+class GenerationTimer(BaseStreamer):
+    """Streamer that splits a generate() call into prefill and decode time.
+
+    generate() passes the prompt to put() first and then the tokens of every
+    decoding step, so the first step marks the end of the prefill. Calls are
+    forwarded to an optional inner streamer.
+    """
+
+    def __init__(self, inner=None):
+        self.inner = inner
+        self.started = time.perf_counter()
+        self.first_token = None
+        self.finished = None
+        self.tokens = 0
+        self._prompt_seen = False
+
+    def put(self, value):
+        if self._prompt_seen:
+            if self.first_token is None:
+                self.first_token = time.perf_counter()
+            self.tokens += value.numel()
+        self._prompt_seen = True
+        if self.inner is not None:
+            self.inner.put(value)
+
+    def end(self):
+        self.finished = time.perf_counter()
+        if self.inner is not None:
+            self.inner.end()
+
+    def record(self, generated_tokens=None, sequences=1):
+        """Export the prefill and decode time, token count and decode throughput.
+
+        Args:
+            generated_tokens: Tokens generated over all sequences (defaults to
+                every token seen, including padding of finished sequences)
+            sequences: Number of sequences generated together
+        """
+        if self.first_token is None:
+            return
+        generated_tokens = self.tokens if generated_tokens is None else generated_tokens
+        decode = (self.finished or time.perf_counter()) - self.first_token
+        metrics.observe("stage_seconds", self.first_token - self.started, stage="prefill")
+        metrics.observe("stage_seconds", decode, stage="decode")
+        metrics.count("persona_generated_tokens_total", generated_tokens)
+        # The first token of each sequence comes out of the prefill
+        if decode > 0 and generated_tokens > sequences:
+            metrics.observe("persona_tokens_per_second", (generated_tokens - sequences) / decode)
+
+
+class PersonaBatcher:
+    """Micro-batch concurrent persona requests into shared generate calls.
+
+    Requests are collected for up to `window_ms` after the first one arrives,
+    or until `max_batch_size` are waiting, then run as one left-padded batch
+    per max_new_tokens value (detailed and brief prompts never share a batch).
+    """
+
+    def __init__(self, generate_batch, window_ms=25, max_batch_size=8):
+        """
+        Args:
+            generate_batch: Callable(contents, max_new_tokens, stop_events) -> list of responses
+            window_ms: How long to wait for more requests after the first one
+            max_batch_size: Maximum number of prompts per generate call
+        """
+        self.generate_batch = generate_batch
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="persona-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, content, max_new_tokens, stop_event=None):
+        """Queue one prompt and return a Future for its response text.
+
+        Setting stop_event drops the prompt if its batch has not started yet,
+        and otherwise stops generating its sequence; the rest of the batch
+        carries on.
+        """
+        future = Future()
+        self._queue.put((content, max_new_tokens, future, stop_event))
+        return future
+
+    def _collect(self):
+        """Block for the first request, then gather more until the window closes."""
+        pending = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(pending) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return pending
+
+    def _run(self):
+        while True:
+            groups = {}
+            for item in self._collect():
+                groups.setdefault(item[1], []).append(item)
+
+            for max_new_tokens, items in groups.items():
+                for item in items:
+                    if item[3] is not None and item[3].is_set():
+                        item[2].cancel()
+                items = [item for item in items if item[2].set_running_or_notify_cancel()]
+                if not items:
+                    continue
+                self.batches += 1
+                self.requests += len(items)
+                try:
+                    responses = self.generate_batch([item[0] for item in items], max_new_tokens,
+                                                    [item[3] for item in items])
+                except Exception as e:
+                    for item in items:
+                        item[2].set_exception(e)
+                    continue
+                for item, response in zip(items, responses):
+                    item[2].set_result(response)
+
+    def stats(self):
+        """Return the number of batches run and their average size."""
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+        }
 
 
 class WalletPersonaGenerator:
-    def __init__(self, hf_token=None):
+    def __init__(self, hf_token=None, max_batch_size=8, batch_window_ms=25, cache_size=256, cache_path=None,
+                 model_id=DEFAULT_MODEL_ID, backend=None, num_threads=None, share_prefix=True):
         """Initialize with the Mistral-7B-Instruct-v0.2 model
         
         Args:
             hf_token: Hugging Face API token for authentication (optional for this model)
+            max_batch_size: Maximum number of concurrent requests generated together
+                (1 disables batching and generates on the calling thread)
+            batch_window_ms: How long to wait for concurrent requests to batch
+            cache_size: Number of generated personas kept in memory (0 disables the cache)
+            cache_path: Optional SQLite file that keeps generated personas across restarts
+            model_id: Hugging Face model id or local path of the model to load
+            backend: One of BACKENDS (defaults to $PERSONA_BACKEND, then "auto")
+            num_threads: CPU threads used for inference (defaults to $PERSONA_NUM_THREADS,
+                then the torch/ONNX Runtime default)
+            share_prefix: Precompute the key/values of the static prompt instructions
+                once and reuse them for every request
         """
         if hf_token:
             login(token=hf_token, write_permission=False)
 
+        self.model_id = model_id
+        self.backend = backend or os.getenv("PERSONA_BACKEND") or "auto"
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {self.backend!r}, expected one of {', '.join(BACKENDS)}")
+        num_threads = num_threads or int(os.getenv("PERSONA_NUM_THREADS", "0")) or None
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
         try:
-            print("Loading Mistral model pipeline...")
-            model_id = "mistralai/Mistral-7B-Instruct-v0.2"
+            print(f"Loading {model_id} with the {self.backend} backend...")
             self.tokenizer = AutoTokenizer.from_pretrained(model_id)
-            self.model = AutoModelForCausalLM.from_pretrained(
-                model_id,
-                device_map="auto",
-                torch_dtype="auto"
-            )
+            self.model = self._load_model(model_id, self.backend, num_threads)
             print("Model loaded successfully")
         except Exception as e:
             print(f"Error loading model: {e}")
             raise
 
-    def generate_persona(self, wallet_data, detailed=True):
-        """Generate a persona using Mistral-7B model."""
+        # Batched prompts are left-padded so every sequence ends where generation starts
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        self.prefix_cache = self._build_prefix_cache() if share_prefix else {}
+
+        self.batcher = None
+        if max_batch_size > 1:
+            self.batcher = PersonaBatcher(self._generate_batch, batch_window_ms, max_batch_size)
+
+        self.persona_cache = None
+        if cache_size > 0:
+            self.persona_cache = TTLCache(maxsize=cache_size, ttl=None, path=cache_path)
+
+    @staticmethod
+    def _load_model(model_id, backend, num_threads=None):
+        """Load the causal LM for the selected backend."""
+        if backend == "auto":
+            return AutoModelForCausalLM.from_pretrained(model_id, device_map="auto", torch_dtype="auto")
+
+        if backend == "onnx":
+            try:
+                import onnxruntime
+                from optimum.onnxruntime import ORTModelForCausalLM
+            except ImportError as e:
+                raise ImportError("The onnx backend requires optimum[onnxruntime]") from e
+            session_options = onnxruntime.SessionOptions()
+            if num_threads:
+                session_options.intra_op_num_threads = num_threads
+            return ORTModelForCausalLM.from_pretrained(
+                model_id,
+                export=True,
+                provider="CPUExecutionProvider",
+                session_options=session_options
+            )
+
+        dtype = torch.bfloat16 if backend == "cpu-bf16" else torch.float32
+        model = AutoModelForCausalLM.from_pretrained(
+            model_id,
+            torch_dtype=dtype,
+            low_cpu_mem_usage=True
+        )
+        if backend == "cpu-int8":
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model.eval()
+
+    def build_prompt(self, wallet_data, detailed=True):
+        """Build the user prompt for a wallet's persona."""
         classifications = wallet_data.get('classifications', [])
         short_addr = f"{wallet_data['address'][:6]}...{wallet_data['address'][-4:]}"
         
         if detailed:
-            content = (
-                f"Generate a detailed persona profile for crypto wallet {short_addr} based on the following on-chain data:\n"
+            content = PERSONA_INSTRUCTIONS[True] + (
+                f"On-chain data of wallet {short_addr}:\n"
                 f"- Total networth: ${wallet_data.get('total_networth', 0):,.2f}\n"
                 f"- Native balance: {wallet_data.get('native_balance', 0):,.2f}\n"
                 f"- Token balance: ${wallet_data.get('token_balance_usd', 0):,.2f}\n"
@@ -54,67 +315,293 @@ class WalletPersonaGenerator:
                 f"- NFT Collections: {wallet_data.get('unique_nft_collections', 0)}\n"
                 f"- Classifications: {', '.join(classifications) if classifications else 'None'}\n"
                 f"- Social Handle: {wallet_data.get('social_handle', 'N/A')}\n"
-                f"\nFictional Persona Journey:\n{wallet_data.get('persona_journey', '')}\n\n"
-                f"Based on these, create a rich, fictional persona including:\n"
-                f"1. Crypto Identity: Who they are in the crypto ecosystem\n"
-                f"2. Trading Style: Their approach, time horizon, transaction patterns\n"
-                f"3. Risk Profile: Their comfort with different types of risk\n"
-                f"4. Blockchain Preferences: Why they choose this chain\n"
-                f"5. Personalized Recommendations: 3-4 specific products or strategies\n\n"
-                f"Format your response as a well-structured markdown document with headers for each section."
+                f"\nFictional Persona Journey:\n{wallet_data.get('persona_journey', '')}"
             )
         else:
-            content = (
-                f"Create a brief crypto persona for wallet {short_addr} with "
-                f"${wallet_data.get('total_networth', 0):,.2f} total worth on {wallet_data.get('chain', 'unknown')} chain. "
-                f"Include identity type, risk profile, and 1-2 recommendations."
+            content = PERSONA_INSTRUCTIONS[False] + (
+                f"Wallet {short_addr} has "
+                f"${wallet_data.get('total_networth', 0):,.2f} total worth on {wallet_data.get('chain', 'unknown')} chain."
             )
+        return content
+
+    def persona_cache_key(self, content, max_new_tokens):
+        """Fingerprint a generation request.
+
+        The key hashes the rendered prompt rather than the raw features, so
+        feature changes below the prompt's display precision hit the cache.
+        """
+        payload = json.dumps({
+            "prompt": content,
+            "model_id": self.model_id,
+            "backend": self.backend,
+            "max_new_tokens": max_new_tokens,
+            **SAMPLING_PARAMS
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def generate_persona(self, wallet_data, detailed=True, use_cache=True, stop_event=None):
+        """Generate a persona using Mistral-7B model.
+
+        Args:
+            wallet_data: Feature dict of the wallet
+            detailed: Generate the detailed persona instead of the brief one
+            use_cache: Return a cached persona for the same prompt if there is one;
+                False always samples a fresh persona (and caches it)
+            stop_event: Optional threading.Event; setting it abandons the generation
+                (a persona cut short this way is not cached)
+        """
+        content = self.build_prompt(wallet_data, detailed)
+        max_new_tokens = 800 if detailed else 300
+
+        key = None
+        if self.persona_cache is not None:
+            key = self.persona_cache_key(content, max_new_tokens)
+            if use_cache:
+                cached = self.persona_cache.get(key)
+                if cached is not None:
+                    metrics.count("cache_hits_total", cache="persona")
+                    return cached
+                metrics.count("cache_misses_total", cache="persona")
 
-        messages = [{"role": "user", "content": content}]
         print("Generating response with Mistral model...")
+        if self.batcher is not None:
+            response = self.batcher.submit(content, max_new_tokens, stop_event).result()
+        else:
+            response = self._generate_batch([content], max_new_tokens, [stop_event])[0]
+
+        if key is not None and not (stop_event is not None and stop_event.is_set()):
+            self.persona_cache.set(key, response)
+        return response
+
+    def warm_up(self, max_new_tokens=8):
+        """Run one short generation so first-request kernel and allocator setup is paid up front."""
+        started = time.perf_counter()
+        content = self.build_prompt({"address": "0x0000000000000000000000000000000000000000"}, detailed=False)
+        self._generate_batch([content], max_new_tokens)
+        duration = time.perf_counter() - started
+        print(f"Warm-up generation finished in {duration:.2f}s")
+        return duration
 
+    def stream_persona(self, wallet_data, detailed=True, use_cache=True, stop_event=None):
+        """Generate a persona and yield its text as tokens are produced.
+
+        A cached persona is yielded in one piece. A freshly generated one is
+        cached once the stream completes.
+
+        Args:
+            stop_event: Optional threading.Event; setting it stops generation
+                early and the partial persona is not cached
+        """
+        content = self.build_prompt(wallet_data, detailed)
         max_new_tokens = 800 if detailed else 300
 
-        input_ids = self.tokenizer.apply_chat_template(
-            messages,
-            return_tensors="pt"
-        ).to(self.model.device)
+        key = None
+        if self.persona_cache is not None:
+            key = self.persona_cache_key(content, max_new_tokens)
+            if use_cache:
+                cached = self.persona_cache.get(key)
+                if cached is not None:
+                    metrics.count("cache_hits_total", cache="persona")
+                    yield cached
+                    return
+                metrics.count("cache_misses_total", cache="persona")
 
-        generated_ids = self.model.generate(
-            input_ids,
-            max_new_tokens=max_new_tokens,
-            temperature=0.7,
-            top_p=0.9,
-            do_sample=True
-        )
+        with metrics.span("tokenize"):
+            inputs = self._tokenize([content])
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        timer = GenerationTimer(streamer)
+        errors = []
+        stopping_criteria = StoppingCriteriaList([StopOnEvent(stop_event)]) if stop_event is not None else None
+
+        def run():
+            try:
+                self.model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    pad_token_id=self.tokenizer.pad_token_id,
+                    streamer=timer,
+                    stopping_criteria=stopping_criteria,
+                    **SAMPLING_PARAMS
+                )
+            except Exception as e:
+                metrics.count("errors_total", stage="generate")
+                errors.append(e)
+                streamer.end()
+
+        print("Streaming response with Mistral model...")
+        thread = threading.Thread(target=run, name="persona-stream", daemon=True)
+        thread.start()
+
+        chunks = []
+        for text in streamer:
+            if not chunks:
+                text = text.lstrip()
+                if not text:
+                    continue
+            chunks.append(text)
+            yield text
+        thread.join()
+        if errors:
+            raise errors[0]
+        timer.record()
 
-        generated_text = self.tokenizer.decode(generated_ids[0], skip_special_tokens=True)
+        if key is not None and not (stop_event is not None and stop_event.is_set()):
+            self.persona_cache.set(key, "".join(chunks).replace("[/INST]", "").strip())
+
+    def persona_cache_stats(self):
+        """Hit/miss counters of the persona cache, or None when it is disabled."""
+        return self.persona_cache.stats() if self.persona_cache is not None else None
+
+    def _build_prefix_cache(self):
+        """Run each static instruction prefix through the model once.
+
+        Returns {instructions: (prefix_ids, past_key_values)}. ONNX Runtime
+        models manage their own cache, so they get no shared prefix.
+        """
+        prefixes = {}
+        if self.backend == "onnx":
+            return prefixes
+
+        marker = "\x00"
+        for instructions in PERSONA_INSTRUCTIONS.values():
+            rendered = self.tokenizer.apply_chat_template(
+                [{"role": "user", "content": instructions + marker}], tokenize=False
+            )
+            prefix_text = rendered[:rendered.index(marker)]
+            prefix_ids = self.tokenizer(
+                prefix_text, return_tensors="pt", add_special_tokens=False
+            )["input_ids"].to(self.model.device)
+            with torch.no_grad():
+                past = self.model(input_ids=prefix_ids, use_cache=True).past_key_values
+            if isinstance(past, DynamicCache):
+                past = past.to_legacy_cache()
+            prefixes[instructions] = (prefix_ids[0], past)
+        print(f"Cached key/values of {len(prefixes)} prompt prefixes")
+        return prefixes
 
-        user_content = messages[-1]["content"]
+    def _prefixed_inputs(self, prompts):
+        """Build generate() inputs that reuse a cached instruction prefix.
 
-        if user_content in generated_text:
-            response_start = generated_text.find(user_content) + len(user_content)
-            response_text = generated_text[response_start:].strip()
-            response_text = response_text.replace("[/INST]", "").strip()
+        Only the wallet-specific suffixes are left-padded; the prefix keeps an
+        all-ones attention mask. Returns None when the prompts don't all start
+        with the same cached prefix (token for token), in which case the caller
+        encodes the full prompts.
+        """
+        for instructions, (prefix_ids, past) in self.prefix_cache.items():
+            if all(instructions in prompt for prompt in prompts):
+                break
         else:
-            response_text = generated_text.strip()
+            return None
+
+        encoded = self.tokenizer(prompts, add_special_tokens=False)["input_ids"]
+        prefix = prefix_ids.tolist()
+        size = len(prefix)
+        if any(ids[:size] != prefix for ids in encoded):
+            return None
+
+        suffixes = [ids[size:] for ids in encoded]
+        width = max(len(ids) for ids in suffixes)
+        pad_id = self.tokenizer.pad_token_id
+        suffix_ids = torch.tensor([[pad_id] * (width - len(ids)) + ids for ids in suffixes])
+        suffix_mask = torch.tensor([[0] * (width - len(ids)) + [1] * len(ids) for ids in suffixes])
+
+        batch = len(prompts)
+        device = self.model.device
+        input_ids = torch.cat([prefix_ids.unsqueeze(0).expand(batch, -1).cpu(), suffix_ids], dim=1)
+        attention_mask = torch.cat([torch.ones(batch, size, dtype=torch.long), suffix_mask], dim=1)
+        # A fresh cache per call: generate() appends to it. The expanded views are
+        # concatenated into new tensors, so the shared prefix is never modified.
+        past_key_values = DynamicCache.from_legacy_cache(tuple(
+            (key.expand(batch, -1, -1, -1), value.expand(batch, -1, -1, -1)) for key, value in past
+        ))
+        return {
+            "input_ids": input_ids.to(device),
+            "attention_mask": attention_mask.to(device),
+            "past_key_values": past_key_values
+        }
+
+    def _tokenize(self, contents):
+        """Apply the chat template and tokenize prompts as one left-padded batch.
+
+        When the prompts share a cached instruction prefix, the returned inputs
+        carry its past key/values so only the wallet data is prefilled.
+        """
+        prompts = [
+            self.tokenizer.apply_chat_template([{"role": "user", "content": content}], tokenize=False)
+            for content in contents
+        ]
+        if self.prefix_cache:
+            inputs = self._prefixed_inputs(prompts)
+            if inputs is not None:
+                return inputs
+
+        # The chat template already contains the BOS token
+        return self.tokenizer(
+            prompts,
+            return_tensors="pt",
+            padding=True,
+            add_special_tokens=False,
+            return_token_type_ids=False
+        ).to(self.model.device)
+
+    def _generate_batch(self, contents, max_new_tokens, stop_events=None):
+        """Generate responses for several prompts in one left-padded generate call.
+
+        Args:
+            contents: Prompts of the batch
+            max_new_tokens: Token limit of every response
+            stop_events: Optional Event (or None) per prompt; a set Event stops its sequence
+        """
+        with metrics.span("tokenize"):
+            inputs = self._tokenize(contents)
+
+        stopping_criteria = None
+        if stop_events is not None and any(event is not None for event in stop_events):
+            stopping_criteria = StoppingCriteriaList([StopOnEvent(list(stop_events))])
+        timer = GenerationTimer()
+        try:
+            generated_ids = self.model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                pad_token_id=self.tokenizer.pad_token_id,
+                streamer=timer,
+                stopping_criteria=stopping_criteria,
+                **SAMPLING_PARAMS
+            )
+        except Exception:
+            metrics.count("errors_total", stage="generate")
+            raise
 
-        return response_text
+        # Keep only the newly generated tokens of each sequence
+        new_tokens = generated_ids[:, inputs["input_ids"].shape[1]:]
+        timer.record(int((new_tokens != self.tokenizer.pad_token_id).sum()), sequences=len(contents))
+        responses = self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+        return [response.replace("[/INST]", "").strip() for response in responses]
 
 
 def main():
     parser = argparse.ArgumentParser(description="Generate crypto wallet personas")
-    parser.add_argument("--wallet", type=str, required=True, help="Wallet address to analyze")
+    parser.add_argument("--wallet", type=str, help="Wallet address to analyze")
     parser.add_argument("--data-dir", type=str, default="web3_kgenX_new", help="Directory with wallet data")
     parser.add_argument("--hf-token", type=str, help="Hugging Face access token (optional)")
     parser.add_argument("--simple", action="store_true", help="Generate simple persona instead of detailed")
     parser.add_argument("--json-output", action="store_true", help="Save persona data as JSON as well")
     parser.add_argument("--html-output", action="store_true", help="Generate interactive HTML report")
+    parser.add_argument("--export-dir", type=str,
+                        help="Render the HTML reports of all wallets in --wallets-file into this directory")
+    parser.add_argument("--wallets-file", type=str, default="web3_kgenX_new/wallets.csv",
+                        help="CSV with a wallet_ID column, used with --export-dir")
     args = parser.parse_args()
+    if not args.wallet and not args.export_dir:
+        parser.error("one of --wallet or --export-dir is required")
 
     print(f"Loading data from {args.data_dir}...")
     data_dict = load_wallet_data(args.data_dir)
 
+    if args.export_dir:
+        export_wallet_reports(args, data_dict)
+        return
+
     print(f"Analyzing wallet {args.wallet}...")
     features = extract_wallet_features(args.wallet, data_dict)
 
@@ -122,8 +609,6 @@ def main():
         print(f"No data found for wallet {args.wallet}")
         return
 
-    features['classifications'] = classify_wallet(features)
-
     generator = WalletPersonaGenerator(hf_token=args.hf_token)
     print("Generating persona...")
     persona_md = generator.generate_persona(features, detailed=not args.simple)
@@ -150,5 +635,21 @@ def main():
         output_html_file = f"persona_report_{args.wallet[:8]}.html"
         generate_html_report(features, persona_md, output_html_file)
 
+def export_wallet_reports(args, data_dict):
+    """Generate personas for every local wallet of --wallets-file and export their reports."""
+    wallets = list(dict.fromkeys(pd.read_csv(args.wallets_file)["wallet_ID"].dropna().astype(str)))
+    features_by_wallet = extract_features_many(wallets, data_dict)
+    print(f"Exporting reports of {len(features_by_wallet)} of {len(wallets)} wallets (others have no local data)")
+
+    generator = WalletPersonaGenerator(hf_token=args.hf_token)
+    # Concurrent requests reach the batcher together and are generated in shared batches
+    workers = generator.batcher.max_batch_size * 2 if generator.batcher is not None else 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        personas = pool.map(
+            lambda features: generator.generate_persona(features, detailed=not args.simple),
+            features_by_wallet.values()
+        )
+        export_reports(zip(features_by_wallet.values(), personas), args.export_dir)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,81 @@
+"""Segment index, cohort queries and /api/cohorts parameter validation."""
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from werkzeug.datastructures import MultiDict
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import dataLoading
+import main
+
+
+@pytest.fixture
+def data():
+    networth = pd.DataFrame({
+        "wallet": ["0xa", "0xa", "0xb", "0xc"],
+        "chain": ["eth", "polygon", "eth", "polygon"],
+        "native_balance": [1.0, 0.0, 500.0, 10.0],
+        "native_balance_usd": [2_000_000.0, 0.0, 50_000.0, 7.0],
+        "token_balance_usd": [0.0, 0.0, 0.0, 0.0],
+        "chain_networth_usd": [2_000_000.0, 0.0, 50_000.0, 7.0],
+        "total_networth_usd": [2_000_000.0, 2_000_000.0, 50_000.0, 7.0],
+    })
+    data = {"networth": networth, "stats": pd.DataFrame(), "tokens": pd.DataFrame(), "defi": pd.DataFrame()}
+    data["features"] = dataLoading.extract_features_bulk(data)
+    data["segments"] = dataLoading.build_segment_index(data["features"], networth)
+    return data
+
+
+def wallets(data, **query):
+    total, positions = dataLoading.query_cohort(data["segments"], limit=None, **query)
+    found = data["segments"]["wallets"][positions].tolist()
+    assert total == len(found)
+    return found
+
+
+def test_chain_filter_skips_zero_balance_rows(data):
+    # 0xa has a polygon row, but nothing on it
+    assert wallets(data, chain="polygon") == ["0xc"]
+    assert wallets(data, chain="ETH") == ["0xa", "0xb"]
+    assert wallets(data, chain="solana") == []
+
+
+def test_labels_and_ranges_combine(data):
+    assert wallets(data, labels=["whale"]) == ["0xa"]
+    assert wallets(data, ranges={"total_networth": (10_000, 100_000)}) == ["0xb"]
+    assert wallets(data, labels=["retail_user"], ranges={"total_networth": (None, 100)}) == ["0xc"]
+    assert wallets(data, labels=["whale"], chain="polygon") == []
+
+
+def test_pagination(data):
+    total, positions = dataLoading.query_cohort(data["segments"], offset=1, limit=1)
+    assert total == 3
+    assert data["segments"]["wallets"][positions].tolist() == ["0xb"]
+
+
+@pytest.mark.parametrize("args, message", [
+    ({"min_risk_score": "nan"}, "min_risk_score must be a number"),
+    ({"max_total_networth": "inf"}, "max_total_networth must be a number"),
+    ({"min_token_count": "-inf"}, "min_token_count must be a number"),
+    ({"min_defi_protocols": "many"}, "min_defi_protocols must be a number"),
+    ({"min_total_networth": "10", "max_total_networth": "5"}, "must not be greater than"),
+    ({"labels": "whale,bogus"}, "Unknown labels: bogus"),
+    ({"limit": "0"}, "limit between"),
+])
+def test_invalid_queries_are_rejected(data, args, message):
+    with pytest.raises(ValueError, match=message):
+        main.parse_cohort_query(MultiDict(args), data["segments"])
+
+
+def test_query_parameters(data):
+    query = main.parse_cohort_query(
+        MultiDict({"labels": "whale", "chain": "eth", "min_total_networth": "5", "max_total_networth": "5",
+                   "count_only": "true"}),
+        data["segments"]
+    )
+    assert query == {"labels": ["whale"], "chain": "eth", "ranges": {"total_networth": (5.0, 5.0)},
+                     "offset": 0, "limit": 0}
@@ -0,0 +1,80 @@
+"""merge_shards replaces the rows of re-fetched wallets and ends the run."""
+import json
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from ingest import ShardWriter, completed_wallets, merge_shards
+
+
+def nft_row(wallet, name):
+    return {"wallet_address": wallet, "token_address": f"0x{name}", "contract_type": "ERC721", "name": name,
+            "verified_collection": False, "count": 1}
+
+
+def write_shard(out_dir, dataset, records, run):
+    writer = ShardWriter(out_dir / ".ingest" / "shards" / dataset / f"{run}.jsonl")
+    for wallet, rows in records.items():
+        writer.write(wallet, rows)
+    writer.close()
+
+
+def test_nft_rows_are_replaced_when_the_csv_had_no_wallet_column(tmp_path):
+    target = tmp_path / "nft_collections_cleaned.csv"
+    # Legacy layout of the bundled CSV: no wallet column at all
+    pd.DataFrame([{k: v for k, v in nft_row(None, "legacy").items() if k != "wallet_address"}]).to_csv(
+        target, index=False
+    )
+
+    write_shard(tmp_path, "nfts", {"0xa": [nft_row("0xa", "one")], "0xb": [nft_row("0xb", "two")]}, "run1")
+    merge_shards(tmp_path, ["nfts"])
+    first = pd.read_csv(target)
+    assert "wallet_address" in first.columns
+    assert sorted(first["name"]) == ["legacy", "one", "two"]
+
+    # Re-ingesting 0xa replaces its rows instead of appending a second copy
+    write_shard(tmp_path, "nfts", {"0xa": [nft_row("0xa", "three")]}, "run2")
+    merge_shards(tmp_path, ["nfts"])
+    second = pd.read_csv(target)
+    assert sorted(second["name"]) == ["legacy", "three", "two"]
+    assert second["wallet_address"].value_counts().to_dict() == {"0xa": 1, "0xb": 1}
+
+    merge_shards(tmp_path, ["nfts"])
+    assert len(pd.read_csv(target)) == 3
+
+
+def test_wallet_keyed_rows_are_replaced(tmp_path):
+    target = tmp_path / "wallet_stats.csv"
+    pd.DataFrame([{"wallet": "0xa", "nfts": 1}, {"wallet": "0xc", "nfts": 3}]).to_csv(target, index=False)
+
+    write_shard(tmp_path, "stats", {"0xa": [{"wallet": "0xa", "nfts": 5}]}, "run1")
+    merge_shards(tmp_path, ["stats"])
+
+    merged = pd.read_csv(target).set_index("wallet")["nfts"].to_dict()
+    assert merged == {"0xa": 5, "0xc": 3}
+
+
+def test_merge_discards_the_merged_run(tmp_path):
+    work_dir = tmp_path / ".ingest"
+    write_shard(tmp_path, "stats", {"0xa": [{"wallet": "0xa", "nfts": 5}]}, "run1")
+    write_shard(tmp_path, "tokens", {"0xa": [{"wallet": "0xa", "token_symbol": "ETH"}]}, "run1")
+    (work_dir / "errors.jsonl").write_text(
+        json.dumps({"dataset": "stats", "wallet": "0xb", "error": "500"}) + "\n"
+        + json.dumps({"dataset": "tokens", "wallet": "0xb", "error": "500"}) + "\n"
+    )
+
+    merge_shards(tmp_path, ["stats"])
+
+    # The next run fetches every stats wallet again; tokens stays unfinished
+    assert completed_wallets(work_dir, "stats") == set()
+    assert completed_wallets(work_dir, "tokens") == {"0xa"}
+    assert [json.loads(line)["dataset"] for line in (work_dir / "errors.jsonl").read_text().splitlines()] == ["tokens"]
+
+    # Merging again without shards leaves the CSV as it is
+    merge_shards(tmp_path, ["stats", "tokens"])
+    assert pd.read_csv(tmp_path / "wallet_stats.csv").to_dict("records") == [{"wallet": "0xa", "nfts": 5}]
+    assert not (work_dir / "errors.jsonl").exists()
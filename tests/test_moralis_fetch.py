@@ -0,0 +1,135 @@
+"""fetch_wallet_data_from_api and cached_moralis_get against a local stub Moralis server."""
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "benchmarks"))
+
+import dataLoading
+from load_test import StubMoralisHandler
+
+WALLET = "0x00000000219ab540356cbb839cbe05303d7705fa"
+# Path suffix of each endpoint fetch_wallet_data_from_api calls
+ENDPOINTS = {"tokens": "/tokens", "networth": "/net-worth", "stats": "/stats", "nfts": "/nft/collections"}
+
+
+class FaultyMoralisHandler(StubMoralisHandler):
+    """StubMoralisHandler that fails or stalls the endpoints listed in the server's settings."""
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        self.server.requests.append(path)
+        endpoint = next(name for name, suffix in ENDPOINTS.items() if path.endswith(suffix))
+        if endpoint in self.server.slow:
+            time.sleep(self.server.slow[endpoint])
+        if endpoint in self.server.failing:
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        super().do_GET()
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FaultyMoralisHandler)
+    server.daemon_threads = True
+    server.requests = []
+    server.failing = set()
+    server.slow = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("MORALIS_BASE_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setenv("MORALIS_API_KEY", "test")
+    dataLoading.moralis_cache.clear()
+    yield server
+    server.shutdown()
+    server.server_close()
+    dataLoading.moralis_cache.clear()
+
+
+def test_fetch_returns_every_table(stub):
+    data = dataLoading.fetch_wallet_data_from_api(WALLET)
+
+    assert data["source"] == "api"
+    assert data["errors"] == {}
+    for name in ENDPOINTS:
+        assert not data[name].empty
+    assert set(data["networth"]["wallet"]) == {WALLET}
+
+
+def test_calls_run_concurrently(stub):
+    stub.slow = dict.fromkeys(ENDPOINTS, 0.5)
+
+    started = time.perf_counter()
+    data = dataLoading.fetch_wallet_data_from_api(WALLET)
+
+    assert data["errors"] == {}
+    # Four sequential calls would take at least 2s
+    assert time.perf_counter() - started < 1.5
+
+
+def test_failing_endpoint_is_listed_in_errors(stub):
+    stub.failing = {"stats"}
+
+    data = dataLoading.fetch_wallet_data_from_api(WALLET)
+
+    assert list(data["errors"]) == ["stats"]
+    assert "500" in data["errors"]["stats"]
+    assert data["stats"].empty
+    assert not data["tokens"].empty and not data["networth"].empty and not data["nfts"].empty
+
+
+def test_slow_endpoint_times_out(stub):
+    stub.slow = {"nfts": 2.0}
+
+    started = time.perf_counter()
+    data = dataLoading.fetch_wallet_data_from_api(WALLET, timeout=0.3)
+
+    assert time.perf_counter() - started < 1.5
+    assert list(data["errors"]) == ["nfts"]
+    assert data["nfts"].empty
+    assert not data["tokens"].empty
+
+
+def test_every_endpoint_failing_returns_none(stub):
+    stub.failing = set(ENDPOINTS)
+
+    assert dataLoading.fetch_wallet_data_from_api(WALLET) is None
+
+
+def test_cached_response_is_reused(stub):
+    path = f"/wallets/{WALLET}/stats"
+    first = dataLoading.cached_moralis_get("stats", WALLET, "eth", path, {"chain": "eth"})
+    # Any case of the address hits the same entry
+    second = dataLoading.cached_moralis_get("stats", WALLET.upper(), "eth", path, {"chain": "eth"})
+
+    assert second == first
+    assert stub.requests == [path]
+
+
+def test_failed_response_is_not_cached(stub):
+    path = f"/wallets/{WALLET}/stats"
+    stub.failing = {"stats"}
+    with pytest.raises(Exception):
+        dataLoading.cached_moralis_get("stats", WALLET, "eth", path, {"chain": "eth"})
+
+    stub.failing = set()
+    assert dataLoading.cached_moralis_get("stats", WALLET, "eth", path, {"chain": "eth"})["nfts"]
+    assert stub.requests == [path, path]
+
+
+def test_uncached_fetch_always_calls_moralis(stub):
+    path = f"/wallets/{WALLET}/stats"
+    dataLoading.cached_moralis_get("stats", WALLET, "eth", path, {"chain": "eth"})
+
+    rows = dataLoading.fetch_stats_rows(WALLET, "eth", use_cache=False)
+    dataLoading.fetch_stats_rows(WALLET, "eth", use_cache=False)
+
+    assert rows[0]["wallet"] == WALLET
+    assert stub.requests == [path, path, path]
@@ -1,7 +1,17 @@
-def generate_html_report(features, persona_markdown, output_path="persona_report.html"):
-    """Generate an interactive HTML report for the wallet persona."""
-    # Basic style for readability
-    style = """
+import hashlib
+import json
+from pathlib import Path
+
+from jinja2 import Environment
+
+import metrics
+
+REPORT_TEMPLATE_SOURCE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8" />
+    <meta name="viewport" content="width=device-width, initial-scale=1" />
+    <title>Wallet Persona Report - {{ features.address }}</title>
     <style>
         body { font-family: Arial, sans-serif; margin: 20px; max-width: 900px; }
         h1, h2, h3 { color: #2c3e50; }
@@ -13,79 +23,144 @@ def generate_html_report(features, persona_markdown, output_path="persona_report
         .recommendation { background: #27ae60; color: white; padding: 6px 10px; border-radius: 6px; margin: 4px 0; }
         pre { background: #f4f4f4; padding: 10px; border-radius: 6px; overflow-x: auto; white-space: pre-wrap; word-wrap: break-word; }
     </style>
-    """
+</head>
+<body>
+    <h1>Wallet Persona Report</h1>
+
+    <div class="section">
+        <h2>Wallet Address</h2>
+        <p><strong>{{ features.address }}</strong></p>
+    </div>
+
+    <div class="section">
+        <h2>Classifications</h2>
+        {% for c in features.classifications or [] %}<span class="tag">{{ c }}</span> {% else %}<p>No classifications</p>{% endfor %}
+    </div>
+
+    <div class="section">
+        <h2>Key Metrics</h2>
+        <table>
+            <tr><th>Metric</th><th>Value</th></tr>
+            <tr><td>Total Networth (USD)</td><td>${{ features.total_networth | number }}</td></tr>
+            <tr><td>Native Balance</td><td>{{ features.native_balance | number(4) }}</td></tr>
+            <tr><td>Token Balance (USD)</td><td>${{ features.token_balance_usd | number }}</td></tr>
+            <tr><td>Chain</td><td>{{ features.chain or 'unknown' }}</td></tr>
+            <tr><td>Token Count</td><td>{{ features.token_count or 0 }}</td></tr>
+            <tr><td>Unique NFT Collections</td><td>{{ features.unique_nft_collections or 0 }}</td></tr>
+            <tr><td>DeFi Protocols</td><td>{{ features.defi_protocols or 0 }}</td></tr>
+            <tr><td>Total DeFi USD</td><td>${{ features.total_defi_usd | number }}</td></tr>
+            <tr><td>Wallet Health Score</td><td>{{ features.wallet_health_score or 0 }}</td></tr>
+            <tr><td>Risk Score</td><td>{{ features.risk_score or 0 }}</td></tr>
+            <tr><td>Activity Score</td><td>{{ features.activity_score or 0 }}</td></tr>
+        </table>
+    </div>
+
+    <div class="section">
+        <h2>Recommendations</h2>
+        {% for rec in features.recommendations or [] %}<div class="recommendation">• {{ rec }}</div>
+        {% else %}<p>No recommendations</p>{% endfor %}
+    </div>
+
+    <div class="section">
+        <h2>Generated Persona Markdown</h2>
+        <pre>{{ persona }}</pre>
+    </div>
+
+</body>
+</html>
+"""
+
+INDEX_TEMPLATE_SOURCE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8" />
+    <title>Wallet Persona Reports</title>
+</head>
+<body>
+    <h1>Wallet Persona Reports</h1>
+    <ul>
+    {% for address, filename in reports %}    <li><a href="{{ filename }}">{{ address }}</a></li>
+    {% endfor %}</ul>
+</body>
+</html>
+"""
+
+
+def _number(value, digits=2):
+    """Format a number with thousands separators (missing values count as 0)."""
+    return f"{value or 0:,.{digits}f}"
+
 
-    # Prepare classifications tags
-    classifications_html = ""
-    for c in features.get("classifications", []):
-        classifications_html += f'<span class="tag">{c}</span> '
-
-    # Prepare recommendations list
-    recs_html = ""
-    for rec in features.get("recommendations", []):
-        recs_html += f'<div class="recommendation">• {rec}</div>\n'
-
-    # Escape markdown for display inside <pre> block
-    # Replace & < > for safety, keep new lines
-    import html
-    safe_persona_md = html.escape(persona_markdown)
-
-    html_content = f"""
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8" />
-        <meta name="viewport" content="width=device-width, initial-scale=1" />
-        <title>Wallet Persona Report - {features.get('address')}</title>
-        {style}
-    </head>
-    <body>
-        <h1>Wallet Persona Report</h1>
-
-        <div class="section">
-            <h2>Wallet Address</h2>
-            <p><strong>{features.get('address')}</strong></p>
-        </div>
-
-        <div class="section">
-            <h2>Classifications</h2>
-            {classifications_html or "<p>No classifications</p>"}
-        </div>
-
-        <div class="section">
-            <h2>Key Metrics</h2>
-            <table>
-                <tr><th>Metric</th><th>Value</th></tr>
-                <tr><td>Total Networth (USD)</td><td>${features.get('total_networth', 0):,.2f}</td></tr>
-                <tr><td>Native Balance</td><td>{features.get('native_balance', 0):,.4f}</td></tr>
-                <tr><td>Token Balance (USD)</td><td>${features.get('token_balance_usd', 0):,.2f}</td></tr>
-                <tr><td>Chain</td><td>{features.get('chain', 'unknown')}</td></tr>
-                <tr><td>Token Count</td><td>{features.get('token_count', 0)}</td></tr>
-                <tr><td>Unique NFT Collections</td><td>{features.get('unique_nft_collections', 0)}</td></tr>
-                <tr><td>DeFi Protocols</td><td>{features.get('defi_protocols', 0)}</td></tr>
-                <tr><td>Total DeFi USD</td><td>${features.get('total_defi_usd', 0):,.2f}</td></tr>
-                <tr><td>Wallet Health Score</td><td>{features.get('wallet_health_score', 0)}</td></tr>
-                <tr><td>Risk Score</td><td>{features.get('risk_score', 0)}</td></tr>
-                <tr><td>Activity Score</td><td>{features.get('activity_score', 0)}</td></tr>
-            </table>
-        </div>
-
-        <div class="section">
-            <h2>Recommendations</h2>
-            {recs_html or "<p>No recommendations</p>"}
-        </div>
-
-        <div class="section">
-            <h2>Generated Persona Markdown</h2>
-            <pre>{safe_persona_md}</pre>
-        </div>
-
-    </body>
-    </html>
+# Compiled once at import; autoescape covers addresses, tags and the persona text
+_environment = Environment(autoescape=True)
+_environment.filters["number"] = _number
+REPORT_TEMPLATE = _environment.from_string(REPORT_TEMPLATE_SOURCE)
+INDEX_TEMPLATE = _environment.from_string(INDEX_TEMPLATE_SOURCE)
+TEMPLATE_VERSION = hashlib.sha256(REPORT_TEMPLATE_SOURCE.encode("utf-8")).hexdigest()[:16]
+
+
+@metrics.timed("render_report")
+def render_html_report(features, persona_markdown):
+    """Render the HTML report of a wallet persona in memory and return it as a string."""
+    return REPORT_TEMPLATE.render(features=features, persona=persona_markdown)
+
+
+def report_etag(features, persona_markdown):
+    """Fingerprint of a report's inputs.
+
+    Equal fingerprints render to the same HTML, so the fingerprint can serve
+    as an ETag and decide whether a report needs rendering at all.
     """
+    payload = json.dumps(
+        {"features": features, "persona": persona_markdown, "template": TEMPLATE_VERSION},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
 
-    # Write the file
+def generate_html_report(features, persona_markdown, output_path="persona_report.html"):
+    """Generate an interactive HTML report for the wallet persona."""
     with open(output_path, "w", encoding="utf-8") as f:
-        f.write(html_content)
+        f.write(render_html_report(features, persona_markdown))
 
     print(f"Interactive persona report generated: {output_path}")
+
+
+def export_reports(reports, output_dir):
+    """Render many reports into a static directory in one pass.
+
+    Each report is written to <address>.html, next to an index.html linking
+    all of them. manifest.json keeps every report's ETag, so a report whose
+    features and persona are unchanged since the last export is not
+    rendered again.
+
+    Args:
+        reports: Iterable of (features, persona_markdown) pairs
+        output_dir: Directory to write the reports to
+
+    Returns:
+        Dict with the number of reports rendered and skipped as unchanged
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / "manifest.json"
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+
+    rendered = skipped = 0
+    for features, persona_markdown in reports:
+        address = features["address"]
+        filename = f"{address}.html"
+        etag = report_etag(features, persona_markdown)
+        if manifest.get(address, {}).get("etag") == etag and (output_dir / filename).exists():
+            skipped += 1
+            continue
+        (output_dir / filename).write_text(render_html_report(features, persona_markdown), encoding="utf-8")
+        manifest[address] = {"file": filename, "etag": etag}
+        rendered += 1
+
+    index = INDEX_TEMPLATE.render(reports=sorted((address, entry["file"]) for address, entry in manifest.items()))
+    (output_dir / "index.html").write_text(index, encoding="utf-8")
+    manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    print(f"Exported {rendered} reports to {output_dir} ({skipped} unchanged)")
+    return {"rendered": rendered, "skipped": skipped}